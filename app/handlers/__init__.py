@@ -4,25 +4,86 @@
 
 """This module provides utility functions for handlers."""
 
+import calendar
+import hashlib
 import logging
 import os
 import re
 
 import cherrypy
+from cherrypy.lib import httputil
 from decorator import decorator
+from google.appengine.api import memcache
 from google.appengine.api import oauth
 from google.appengine.api import users
 from google.appengine.ext import db
 import json
 import pystache
+from pystache.context import ContextStack
+from pystache.renderengine import RenderEngine
 import routes
 
 from models.package import Package
 from models.package_version import PackageVersion
 from models.private_key import PrivateKey
-
-_renderer = pystache.Renderer(search_dirs = [
-        os.path.join(os.path.dirname(__file__), '../views')])
+from models.semantic_version import SemanticVersion
+
+_VIEWS_DIR = os.path.join(os.path.dirname(__file__), '../views')
+
+_renderer = pystache.Renderer(search_dirs = [_VIEWS_DIR])
+
+# Templates are parsed once per instance and cached here, keyed by name. The
+# parsed templates only hold on to the engine, not to any one render's context,
+# so they can be rendered any number of times, from any thread.
+_templates = {}
+
+def _to_unicode(s):
+    """Convert a string to unicode, preserving any unicode subclass."""
+    if isinstance(s, unicode): return s
+    return _renderer.unicode(s)
+
+def _literal(s):
+    """Convert a value interpolated without escaping, as _renderer would."""
+    return unicode(_to_unicode(s))
+
+def _escape(s):
+    """Convert and escape an interpolated value, as _renderer would."""
+    return unicode(_renderer.escape(_to_unicode(s)))
+
+# The engine that renders parsed templates. No views use partials, so they're
+# loaded without being cached.
+_engine = RenderEngine(load_partial=_renderer.load_template,
+                       literal=_literal, escape=_escape)
+
+def _template(name):
+    """Return the parsed template with the given name, loading it if needed."""
+    template = _templates.get(name)
+    if template is None:
+        # The vendored pystache (0.5.2) has no public way to parse a template
+        # once and render it many times; that was added in 0.5.3 as
+        # pystache.parse(). Until it's upgraded, this is the one place that
+        # relies on the engine's internals.
+        template = _engine._parse(_to_unicode(_renderer.load_template(name)))
+        _templates[name] = template
+    return template
+
+def _render_template(name, *context, **kwargs):
+    """Render the template with the given name without a layout."""
+    return unicode(_template(name).render(
+        ContextStack.create(*context, **kwargs)))
+
+def warm_up_templates():
+    """Parse every template in views/ so that rendering them is fast.
+
+    This is run when a new instance is warmed up, so the first requests it
+    serves don't have to load and parse the templates they use.
+    """
+    for root, _, filenames in os.walk(_VIEWS_DIR):
+        for filename in filenames:
+            name, extension = os.path.splitext(filename)
+            if extension != '.' + _renderer.file_extension: continue
+            relative = os.path.relpath(os.path.join(root, name), _VIEWS_DIR)
+            _template(relative.replace(os.sep, '/'))
 
 def render(name, *context, **kwargs):
     """Renders a Mustache template with the standard layout.
@@ -35,8 +96,7 @@ def render(name, *context, **kwargs):
     views/layout.mustache), unless layout=False is passed."""
 
     kwargs_for_layout = kwargs.pop('layout', {})
-    content = _renderer.render(
-        _renderer.load_template(name), *context, **kwargs)
+    content = _render_template(name, *context, **kwargs)
     if kwargs_for_layout == False: return content
     return layout(content, **kwargs_for_layout)
 
@@ -58,8 +118,8 @@ def layout(content, title=None):
 
     package = request().maybe_package
 
-    return _renderer.render(
-        _renderer.load_template("layout"),
+    return _render_template(
+        "layout",
         content=content,
         logged_in=users.get_current_user() is not None,
         login_url=users.create_login_url(cherrypy.url()),
@@ -85,6 +145,72 @@ def http_error(status, message=None):
     if message: message = message.encode('utf-8')
     raise cherrypy.HTTPError(status, message)
 
+def check_etag(etag):
+    """Set the ETag of the current response.
+
+    If the client sent an If-None-Match header that matches etag, this ends the
+    request with a 304 Not Modified, so it should be called before doing any
+    work to build the response.
+
+    Arguments:
+      etag: The unquoted strong entity tag for the response.
+    """
+    etag = '"%s"' % etag
+    cherrypy.response.headers['ETag'] = etag
+
+    if_none_match = cherrypy.request.headers.get('If-None-Match')
+    if not if_none_match: return
+    # If-None-Match uses weak comparison, so weak tags count as well.
+    tags = [re.sub(r'^W/', '', tag.strip())
+            for tag in if_none_match.split(',')]
+    if etag in tags or '*' in tags: raise cherrypy.HTTPRedirect([], 304)
+
+def accepts_gzip():
+    """Return whether the client accepts responses compressed with gzip."""
+    for encoding in cherrypy.request.headers.elements('Accept-Encoding'):
+        if encoding.value in ['gzip', 'x-gzip']: return encoding.qvalue > 0
+    return False
+
+def check_version_etag(package_name, version, mutable=True):
+    """Set the ETag of a response that describes a package version.
+
+    Like check_etag, this ends the request with a 304 Not Modified if the client
+    already has the current response. The tag is derived from the version, so
+    this doesn't need to load it.
+
+    Arguments:
+      package_name: The name of the version's package.
+      version: The version number, as requested.
+      mutable: Whether the response includes fields that change after the
+        version is uploaded, such as its download count. If so, the tag also
+        includes its package's generations, which change whenever those
+        fields do. Otherwise the tag is the same for as long as the version
+        exists, so clients can keep revalidating it when other versions are
+        uploaded.
+    """
+    validators = Package.get_validators(package_name)
+    if validators is None: return
+    try:
+        canonical = SemanticVersion(version).canonical
+    except ValueError:
+        return
+    if not mutable:
+        check_etag('%s-%s' % (package_name, canonical))
+        return
+    check_etag('%s-%s-%d-%d' % (package_name, canonical,
+                                validators['generation'],
+                                validators['downloads_generation']))
+
+def set_last_modified(time):
+    """Set the Last-Modified header of the current response.
+
+    Arguments:
+      time: A naive datetime in UTC, or None if it isn't known.
+    """
+    if time is None: return
+    cherrypy.response.headers['Last-Modified'] = \
+        httputil.HTTPDate(calendar.timegm(time.utctimetuple()))
+
 class JsonError(cherrypy.HTTPError):
     """The error class for JSON responses.
 
@@ -282,8 +408,10 @@ def get_oauth_user():
     """Return the OAuth db.User object.
 
     Throws an oauth.OAuthRequestError if the OAuth request is invalid.
+
+    The user is only resolved once per request. See Request.oauth_user.
     """
-    return oauth.get_current_user(OAUTH2_SCOPE)
+    return request().oauth_user
 
 def is_current_user_admin():
     """Return whether there is a logged-in admin.
@@ -292,11 +420,7 @@ def is_current_user_admin():
     logged in via OAuth.
     """
     if users.is_current_user_admin(): return True
-
-    # The OAUTH_IS_ADMIN variable is only set once oauth.get_current_user is
-    # called.
-    get_current_user()
-    return os.environ.get('OAUTH_IS_ADMIN') == '1'
+    return request().is_oauth_admin
 
 def is_current_user_dogfooder():
     """Return whether the logged-in user has dogfood permissions.
@@ -344,7 +468,13 @@ def set_is_dev_server(is_dev_server):
     _mock_is_dev_server = is_dev_server
 
 def request():
-    """Return the current Request instance."""
+    """Return the current Request instance.
+
+    Outside of a request (for example, in a deferred task) cherrypy.request is
+    a default object that's shared by everything, so no state is kept on it and
+    a fresh Request is returned each time.
+    """
+    if cherrypy.request.app is None: return Request(cherrypy.request)
     if not hasattr(cherrypy.request, 'pub_data'):
         setattr(cherrypy.request, 'pub_data', Request(cherrypy.request))
     return cherrypy.request.pub_data
@@ -356,6 +486,13 @@ _API_VERSION = re.compile(r"^v([0-9]+)$")
 
 _MAX_API_VERSION = 2
 
+_BEARER_TOKEN = re.compile(r"^Bearer\s+(\S+)$", re.IGNORECASE)
+
+# How long (in seconds) the user an OAuth2 bearer token belongs to is cached, so
+# that a client making several requests in a row (such as "pub publish") only
+# has its token checked once. Set this to None to disable the cache.
+_OAUTH_CACHE_TIME = 60
+
 class Request(object):
     """A collection of request-specific helpers."""
 
@@ -366,6 +503,10 @@ class Request(object):
         self._package_version = None
         self._api_version = None
         self._is_api_request = None
+        self._oauth_resolved = False
+        self._oauth_user = None
+        self._oauth_is_admin = False
+        self._oauth_error = None
 
     def url(self, **kwargs):
         """Construct a URL for a given set of parametters.
@@ -438,7 +579,11 @@ class Request(object):
 
         Most route information is available in the request parameters, but the
         controller and action components get stripped out early.
+
+        This is normally the match the dispatcher already made for the request.
         """
+        if not self._route:
+            self._route = getattr(self.request, 'pub_route', None)
         if not self._route:
             mapper = routes.request_config().mapper
             self._route = mapper.match(self.request.path_info)
@@ -493,6 +638,63 @@ class Request(object):
         else:
             return self.request.params.get('package_id')
 
+    @property
+    def oauth_user(self):
+        """Return the OAuth db.User object for this request.
+
+        Throws an oauth.OAuthRequestError if the OAuth request is invalid.
+
+        Checking OAuth2 credentials is an RPC, so the result (including any
+        error) is remembered for the rest of the request, and successful
+        results are cached by bearer token for _OAUTH_CACHE_TIME seconds.
+        """
+        self._resolve_oauth()
+        if self._oauth_error is not None: raise self._oauth_error
+        return self._oauth_user
+
+    @property
+    def is_oauth_admin(self):
+        """Return whether the request is from an admin logged in via OAuth."""
+        self._resolve_oauth()
+        return self._oauth_is_admin
+
+    def _resolve_oauth(self):
+        """Look up the OAuth2 user for this request, if it hasn't been yet."""
+        if self._oauth_resolved: return
+        self._oauth_resolved = True
+
+        cache_key = self._oauth_cache_key
+        if cache_key is not None:
+            cached = memcache.get(cache_key)
+            if cached is not None:
+                self._oauth_user, self._oauth_is_admin = cached
+                return
+
+        try:
+            self._oauth_user = oauth.get_current_user(OAUTH2_SCOPE)
+        except oauth.OAuthRequestError, e:
+            self._oauth_error = e
+            return
+
+        # The OAUTH_IS_ADMIN variable is only set once oauth.get_current_user
+        # is called.
+        self._oauth_is_admin = os.environ.get('OAUTH_IS_ADMIN') == '1'
+        if cache_key is not None:
+            memcache.set(cache_key, (self._oauth_user, self._oauth_is_admin),
+                         time=_OAUTH_CACHE_TIME)
+
+    @property
+    def _oauth_cache_key(self):
+        """The memcache key for the user of this request's bearer token.
+
+        This is None if there's no bearer token or the cache is disabled.
+        """
+        if _OAUTH_CACHE_TIME is None: return None
+        match = _BEARER_TOKEN.match(
+            self.request.headers.get('Authorization', ''))
+        if not match: return None
+        return 'oauth_user_' + hashlib.sha256(match.group(1)).hexdigest()
+
     @property
     def has_oauth(self):
         """Return whether the request contains OAuth2 credentials.
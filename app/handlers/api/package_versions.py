@@ -21,9 +21,13 @@ from google.appengine.api import users
 import handlers
 import models
 from handlers import cloud_storage
+from models import search_index
 from models.package import Package
+from models.package_feed import PackageFeed
 from models.package_version import PackageVersion
 from models.private_key import PrivateKey
+from models.recent_packages import RecentPackages
+from models.version_constraint import VersionConstraint
 
 class PackageVersions(object):
     """The handler for /api/packages/*/versions/*."""
@@ -77,7 +81,7 @@ class PackageVersions(object):
             if 'id' in route: del route['id']
 
             try:
-                with closing(cloud_storage.read('tmp/' + id)) as f:
+                with closing(cloud_storage.stream('tmp/' + id)) as f:
                     version = PackageVersion.from_archive(
                         f, uploaderEmail=handlers.get_oauth_user().email())
             except (KeyError, files.ExistenceError):
@@ -97,36 +101,56 @@ class PackageVersions(object):
                         (version.package.name, version.version)
                     handlers.http_error(400, message)
 
-                if self._should_update_latest_version(version):
-                    version.package.latest_version = version
-            else:
-                version.package.latest_version = version
-
             cloud_storage.modify_object(version.storage_path,
                                         acl='public-read',
                                         copy_source='tmp/' + id)
 
-            with models.transaction():
-                version.package.put()
-                version.put()
+            new_package = version.package
+            def txn():
+                # The package was loaded before the archive was copied, and
+                # may have changed since (for example, by a download roll-up),
+                # so it's read again here rather than overwritten.
+                package = Package.get_by_key_name(new_package.name)
+                is_new_package = package is None
+                if is_new_package: package = new_package
+                version.package = package
+                if is_new_package or \
+                        self._should_update_latest_version(version):
+                    package.latest_version = version
+
+                versions_to_put = version.assign_sort_order()
                 version.package.invalidate_cache()
-
-            deferred.defer(self._compute_version_order, version.package.name)
+                version.package.put()
+                db.put(versions_to_put)
+
+                # The package count is in a different entity group, so it's
+                # updated by a task that's only enqueued if this commits.
+                if is_new_package:
+                    deferred.defer(Package.increment_total_count,
+                                   _transactional=True)
+
+                # Likewise the list of recently updated packages and the feed,
+                # which only change if this is the package's new latest
+                # version.
+                if Package.latest_version.get_value_for_datastore(
+                        version.package) == version.key():
+                    deferred.defer(RecentPackages.update, version.package.name,
+                                   _transactional=True)
+                    deferred.defer(PackageFeed.update, version.package.name,
+                                   _transactional=True)
+                    deferred.defer(Package.increment_listing_generation,
+                                   _transactional=True)
+            db.run_in_transaction(txn)
+
+            version.package.update_document()
+            version.prerender()
+            deferred.defer(search_index.index_package, version.package.name)
 
             return handlers.json_success('%s %s uploaded successfully.' %
                 (version.package.name, version.version))
         finally:
             cloud_storage.delete_object('tmp/' + id)
 
-    def _compute_version_order(self, name):
-        """Compute the sort order for all versions of a given package."""
-        versions = list(Package.get_by_key_name(name).version_set.run())
-        versions.sort(key=lambda version: version.version)
-        for i, version in enumerate(versions):
-            version.sort_order = i
-        with models.transaction():
-            for version in versions: version.put()
-
     def _should_update_latest_version(self, new):
         """Whether or not the latest version of a package should be updated.
 
@@ -165,6 +189,42 @@ class PackageVersions(object):
         cherrypy.response.status = 204
         return ""
 
+    @handlers.api(2)
+    def best(self, package_id, constraint='any'):
+        """Retrieve the best version of a package that matches a constraint.
+
+        The best version is the one the package's latest_version would be if
+        it only had the versions the constraint allows. This is answered from
+        a cached index of the package's versions, without loading them.
+
+        Arguments:
+          constraint: A version constraint, as written in a pubspec.
+        """
+        try:
+            constraint = VersionConstraint.parse(constraint)
+        except ValueError as e:
+            handlers.http_error(400, str(e))
+
+        validators = Package.get_validators(package_id)
+        if validators is None:
+            handlers.http_error(404, "Package \"%s\" doesn't exist." %
+                                package_id)
+
+        version = constraint.best_match(Package.get_version_index(
+            package_id, validators['generation']))
+        if version is None:
+            handlers.http_error(404, "No version of \"%s\" matches the "
+                                "constraint." % package_id)
+
+        return json.dumps({
+            'version': str(version),
+            'url': models.url(controller='api.versions', action='show',
+                              package_id=package_id, id=str(version)),
+            'archive_url': models.url(controller='versions', action='show',
+                                      package_id=package_id, id=str(version),
+                                      format='tar.gz')
+        })
+
     @handlers.api(2)
     def show(self, package_id, id, format=None):
         """Retrieve the document describing a package version."""
@@ -173,8 +233,10 @@ class PackageVersions(object):
         # for "1.2.3". It thinks "3" is the format, which is wrong, so we add it
         # on here.
         if format: id = id + '.' + format
-        return json.dumps(
-            handlers.request().package_version(id).as_dict(full=True))
+        handlers.check_version_etag(package_id, id)
+        version = handlers.request().package_version(id)
+        handlers.set_last_modified(version.created)
+        return json.dumps(version.as_dict(full=True))
 
     @handlers.api(1)
     @handlers.requires_oauth_key
@@ -2,6 +2,7 @@
 # for details. All rights reserved. Use of this source code is governed by a
 # BSD-style license that can be found in the LICENSE file.
 
+from collections import OrderedDict
 import json
 
 import cherrypy
@@ -10,6 +11,10 @@ from google.appengine.api import users
 import handlers
 from handlers.pager import QueryPager
 from models.package import Package
+from models.recent_packages import RecentPackages
+
+# The maximum number of packages whose documents can be requested at once.
+_MAX_BATCH_SIZE = 200
 
 class Packages(object):
     """The handler for /api/packages/*."""
@@ -21,11 +26,25 @@ class Packages(object):
         Arguments:
           page: The page of packages to get. Each page contains 50 packages.
         """
-        pager = QueryPager(int(page), "/api/packages?page=%d",
+        page = int(page)
+        pager = QueryPager(page, "/api/packages?page=%d",
                            Package.all().order('-updated'),
-                           per_page=100)
+                           Package.listing_generation(),
+                           per_page=100, count=Package.total_count())
+        # The first page's packages are named by the list of recent packages,
+        # so they can be loaded by key rather than queried for. The list
+        # doesn't hold pubspecs, so the packages still need to be loaded.
+        if page == 1:
+            names = [package['name']
+                     for package in RecentPackages.get_packages(100)]
+            packages = [package for package in Package.get_by_key_name(names)
+                        if package is not None]
+        else:
+            packages = pager.get_items()
+        packages = [package.as_dict() for package in
+                    Package.prefetch_latest_versions(packages)]
         return json.dumps({
-            "packages": [package.as_dict() for package in pager.get_items()],
+            "packages": packages,
             "prev_url": pager.prev_url,
             "next_url": pager.next_url,
             "pages": pager.page_count
@@ -33,5 +52,83 @@ class Packages(object):
 
     @handlers.api(2)
     def show(self, id):
-        """Retrieve the page describing a specific package."""
-        return handlers.request().package.as_json()
+        """Retrieve the page describing a specific package.
+
+        The document only changes when the package's generation or downloads
+        generation does, so a client that already has the current document
+        gets a 304 without the package being loaded.
+
+        The document is stored and cached pre-compressed, so clients that
+        accept gzip get the compressed bytes as they are, and it's decompressed
+        for those that don't. The App Engine frontend passes a Content-Encoding
+        set by the app through to clients whose requests accepted gzip. It may
+        also drop Accept-Encoding from requests before they reach the app, in
+        which case the client just gets the decompressed document.
+        """
+        compressed = handlers.accepts_gzip()
+        cherrypy.response.headers['Vary'] = 'Accept-Encoding'
+
+        validators = Package.get_validators(id)
+        if validators is not None:
+            handlers.set_last_modified(validators['updated'])
+            handlers.check_etag('%s-%d-%d%s' % (
+                id, validators['generation'],
+                validators['downloads_generation'],
+                '-gzip' if compressed else ''))
+
+        document = handlers.request().package.as_json(compressed=compressed)
+        if compressed: cherrypy.response.headers['Content-Encoding'] = 'gzip'
+        return document
+
+    @handlers.api(2)
+    def compact(self, id, since=None):
+        """Retrieve the compact document listing a package's versions.
+
+        This only includes what a dependency solver needs. See
+        Package.as_versions_json.
+
+        Arguments:
+          since: If this is passed, only versions that have changed since this
+            generation of the package are listed.
+        """
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                handlers.json_error(400, '"since" must be an integer.')
+
+        validators = Package.get_validators(id)
+        if validators is not None:
+            handlers.check_etag('%s-%d-compact-%s' % (
+                id, validators['generation'], since))
+
+        return handlers.request().package.as_versions_json(since=since)
+
+    @handlers.api(2)
+    def batch(self, names=''):
+        """Retrieve the documents describing several packages at once.
+
+        This saves clients that need many packages, such as a dependency
+        solver, from making a request for each one.
+
+        Arguments:
+          names: A comma-separated list of package names. This may also be
+            passed more than once.
+
+        Returns: A JSON object whose "packages" field maps each requested
+          package that exists to the same document show() returns.
+        """
+        if isinstance(names, list): names = ','.join(names)
+        names = [name for name in names.split(',') if name]
+        if len(names) > _MAX_BATCH_SIZE:
+            handlers.json_error(
+                400, "No more than %d packages may be requested at once." %
+                    _MAX_BATCH_SIZE)
+        names = OrderedDict.fromkeys(names).keys()
+
+        # The documents are already JSON, so they're spliced into the response
+        # rather than being decoded and encoded again.
+        documents = Package.get_json_multi(names)
+        return '{"packages":{%s}}' % ','.join(
+            '%s:%s' % (json.dumps(name), documents[name])
+            for name in names if name in documents)
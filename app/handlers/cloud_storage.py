@@ -37,6 +37,10 @@ _FULL_CONTROL_SCOPE = "https://www.googleapis.com/auth/devstorage.full_control"
 # a time.
 _CHUNK_SIZE = 32 * 10**6
 
+# The size (in bytes) of the buffer used when streaming an object from cloud
+# storage.
+_STREAM_BUFFER_SIZE = 2**20
+
 class Upload(object):
     """Represents the data required to upload a file to cloud storage.
 
@@ -244,6 +248,15 @@ def read(obj):
         io.seek(0)
         return io
 
+def stream(obj):
+    """Opens an object in cloud storage to be read sequentially.
+
+    Unlike read(), this never holds the whole object in memory. Data is fetched
+    in buffered chunks as it's read, so it's best suited to consumers that read
+    straight through the object without seeking."""
+    return cloudstorage.open(_gcs_appengine_object_path(obj), 'r',
+                             read_buffer_size=_STREAM_BUFFER_SIZE)
+
 def object_url(obj):
     """Returns the URL for an object in cloud storage."""
     if handlers.is_production():
@@ -4,9 +4,10 @@
 
 from google.appengine.api import oauth
 from google.appengine.api import users
+from google.appengine.ext import db
 
 import handlers
-import models
+from models.package import Package
 
 class PackageUploaders(object):
     """The handler for packages/*/uploaders/*.
@@ -17,28 +18,33 @@ class PackageUploaders(object):
 
     @handlers.json_action
     @handlers.requires_uploader
-    @models.transactional
     def create(self, package_id, format, email):
         """Add a new uploader for this package.
 
         Only other uploaders may add new uploaders."""
 
-        package = handlers.request().package
-        if package.has_uploader_email(email):
-            handlers.http_error(
-                400, "User '%s' is already an uploader for package '%s'." %
-                         (email, package.name))
+        def txn():
+            # Read the package again in case it's changed since this request
+            # loaded it, for example by a download roll-up.
+            package = Package.get(handlers.request().package.key())
+            if package.has_uploader_email(email):
+                handlers.http_error(
+                    400, "User '%s' is already an uploader for package '%s'." %
+                             (email, package.name))
 
-        package.uploaderEmails.append(email)
-        package.put()
-        package.invalidate_cache()
+            package.uploaderEmails.append(email)
+            package.invalidate_cache()
+            package.put()
+            return package
+        package = db.run_in_transaction(txn)
+
+        package.update_document()
         return handlers.json_success(
             "'%s' added as an uploader for package '%s'." %
                 (email, package.name))
 
     @handlers.json_action
     @handlers.requires_uploader
-    @models.transactional
     def delete(self, package_id, id, format):
         """Delete one of this package's uploaders.
 
@@ -46,23 +52,29 @@ class PackageUploaders(object):
         uploader may not be deleted until a new one is added.
         """
 
-        package = handlers.request().package
         email = id
-        if not package.has_uploader_email(email):
-            handlers.http_error(
-                400, "'%s' isn't an uploader for package '%s'." %
-                         (email, package.name))
-
-        if len(package.uploaderEmails) == 1:
-            handlers.http_error(
-                400, ("Package '%s' only has one uploader, so that uploader " +
-                          "can't be removed.") % package.name)
-
-        email_to_delete = email.lower()
-        package.uploaderEmails = [email for email in package.uploaderEmails
-                                  if email.lower() != email_to_delete]
-        package.put()
-        package.invalidate_cache()
+        def txn():
+            package = Package.get(handlers.request().package.key())
+            if not package.has_uploader_email(email):
+                handlers.http_error(
+                    400, "'%s' isn't an uploader for package '%s'." %
+                             (email, package.name))
+
+            if len(package.uploaderEmails) == 1:
+                handlers.http_error(
+                    400, ("Package '%s' only has one uploader, so that " +
+                          "uploader can't be removed.") % package.name)
+
+            email_to_delete = email.lower()
+            package.uploaderEmails = [
+                uploader for uploader in package.uploaderEmails
+                if uploader.lower() != email_to_delete]
+            package.invalidate_cache()
+            package.put()
+            return package
+        package = db.run_in_transaction(txn)
+
+        package.update_document()
         return handlers.json_success(
             "'%s' is no longer an uploader for package '%s'." %
                 (id, package.name))
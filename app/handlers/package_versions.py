@@ -7,23 +7,33 @@ from contextlib import closing
 from uuid import uuid4
 import json
 import logging
-import time
 
 import cherrypy
 import routes
 from google.appengine.ext import db
 from google.appengine.ext import deferred
 from google.appengine.api import files
-from google.appengine.api import memcache
 from google.appengine.api import oauth
 from google.appengine.api import users
 
 import handlers
 import models
 from handlers import cloud_storage
+from models import search_index
+from models.download_shard import DownloadShard
 from models.package import Package
+from models.package_feed import PackageFeed
+from models.package_reload import PackageReload, ReloadShard
 from models.package_version import PackageVersion
 from models.private_key import PrivateKey
+from models.recent_packages import RecentPackages
+
+# The maximum number of shards a package reload is split into. Each shard reloads
+# one package version at a time, so this limits the reload's concurrency.
+_RELOAD_SHARDS = 8
+
+# The number of package versions a reload shard handles in each task.
+_RELOAD_BATCH_SIZE = 20
 
 class PackageVersions(object):
     """The handler for packages/*/versions/*.
@@ -53,10 +63,14 @@ class PackageVersions(object):
         if id.endswith('.tar.gz'):
             id = id[0:-len('.tar.gz')]
             version = handlers.request().package_version(id)
+            DownloadShard.record(version.package.name,
+                                 version.version.canonical)
             raise cherrypy.HTTPRedirect(version.download_url)
         elif id.endswith('.yaml'):
             id = id[0:-len('.yaml')]
+            handlers.check_version_etag(package_id, id, mutable=False)
             version = handlers.request().package_version(id)
+            handlers.set_last_modified(version.created)
             cherrypy.response.headers['Content-Type'] = 'text/yaml'
             return version.pubspec.to_yaml()
         else:
@@ -75,28 +89,94 @@ class PackageVersions(object):
         return upload.to_json()
 
     def reload(self):
-        """Reload all package versions from their tarballs."""
+        """Reload all package versions from their tarballs.
+
+        If the previous reload never finished, this resumes its unfinished
+        shards from their checkpoints rather than starting over.
+        """
         if not handlers.is_current_user_dogfooder(): handlers.http_error(403)
-        query = PackageVersion.all(keys_only=True)
-        memcache.set('versions_to_reload', query.count())
-        memcache.set('versions_reloaded', 0)
 
-        for key in query.run():
-            name = 'reload-%s-%s' % (int(time.time()), key)
-            deferred.defer(self._reload_version, key, _name=name)
+        reload = PackageReload.current()
+        if reload is None or reload.get_status() is None:
+            query = PackageVersion.all(keys_only=True).order('__key__')
+            reload = PackageReload.start(
+                query.run(batch_size=1000), _RELOAD_SHARDS)
+            shards = reload.shards
+        else:
+            # A shard that's recorded a checkpoint recently still has a task
+            # working on it, and deferring another would reload its versions
+            # twice at once.
+            shards = [shard for shard in reload.shards if not shard.running]
+
+        for shard in shards:
+            if shard.done: continue
+            deferred.defer(self._reload_shard, shard.key(), shard.last)
         raise cherrypy.HTTPRedirect('/admin#tab-packages')
 
+    def _reload_shard(self, key, last):
+        """Reload the next batch of package versions in a reload shard.
+
+        Each batch reloads up to _RELOAD_BATCH_SIZE versions, records a
+        checkpoint, and then defers the following batch. Since each shard is a
+        chain of tasks that runs one at a time, the number of shards limits how
+        many versions are reloaded at once.
+
+        Arguments:
+          key: The key of the ReloadShard.
+          last: The shard's checkpoint when this batch was deferred. If the
+            shard has moved on since then, this task is stale and does nothing.
+        """
+        shard = ReloadShard.get(key)
+        if shard.done or shard.last != last: return
+
+        # Each version's key is a child of its package's key, so every version
+        # of the packages in the shard sorts between its boundaries.
+        query = PackageVersion.all(keys_only=True).order('__key__')
+        if last is None:
+            query.filter('__key__ >=', shard.package_key(shard.start))
+        else:
+            query.filter('__key__ >', db.Key(last))
+        if shard.end is not None:
+            query.filter('__key__ <', shard.package_key(shard.end))
+        version_keys = query.fetch(_RELOAD_BATCH_SIZE)
+
+        for version_key in version_keys:
+            self._reload_version(version_key)
+
+        count = len(version_keys)
+        done = count < _RELOAD_BATCH_SIZE
+        new_last = str(version_keys[-1]) if version_keys else last
+        if not shard.checkpoint(last, new_last, count, done): return
+        if version_keys:
+            logging.info('Reloaded %s versions through %s %s' %
+                         (count, version_keys[-1].parent().name(),
+                          version_keys[-1].name()))
+
+        if not done: deferred.defer(self._reload_shard, key, new_last)
+
     def _reload_version(self, key):
-        """Reload a single package version from its tarball."""
+        """Reload a single package version from its tarball.
+
+        If the version can't be reloaded, the error is logged rather than
+        raised, so that one bad archive doesn't stop the rest of its shard.
+        """
+        try:
+            self._reload_version_from_archive(key)
+        except Exception:
+            logging.exception('Error reloading %s %s' %
+                              (key.parent().name(), key.name()))
+
+    def _reload_version_from_archive(self, key):
+        """Replace a package version with one read from its tarball."""
 
         version = PackageVersion.get(key)
         logging.info('Reloading %s %s' % (version.package.name, version.version))
 
-        with closing(cloud_storage.read(version.storage_path)) as f:
+        with closing(cloud_storage.stream(version.storage_path)) as f:
             new_version = PackageVersion.from_archive(
                 f, uploaderEmail=version.uploaderEmail)
 
-        with models.transaction():
+        def txn():
             # Reload the old version in case anything (e.g. sort order) changed.
             version = PackageVersion.get(key)
             package = version.package
@@ -119,14 +199,34 @@ class PackageVersions(object):
             # Only save the package if its latest version has been updated.
             # Otherwise, its latest version may be being updated in parallel,
             # causing icky bugs.
+            #
+            # The package's document can't be rebuilt here, since this doesn't
+            # run within a request. Invalidating the cache bumps the package's
+            # generation, so the document will be rebuilt the next time it's
+            # requested.
             if latest_version_key == key:
-                package.put()
                 package.invalidate_cache()
+                package.put()
+                deferred.defer(RecentPackages.update, package.name,
+                               _transactional=True)
+                deferred.defer(PackageFeed.update, package.name, refresh=True,
+                               _transactional=True)
+            return latest_version_key == key
+        is_latest = db.run_in_transaction(txn)
+
+        new_version.prerender()
+        if is_latest:
+            search_index.index_package(key.parent().name())
 
+    def roll_up_downloads(self):
+        """Add recorded downloads to the package and version totals.
 
-        count = memcache.incr('versions_reloaded')
-        logging.info('%s/%s versions reloaded' %
-                     (count, memcache.get('versions_to_reload')))
+        This is run periodically by cron.
+        """
+        if cherrypy.request.headers.get('X-Appengine-Cron') != 'true' and \
+                not users.is_current_user_admin():
+            handlers.http_error(403, "Permission denied.")
+        DownloadShard.roll_up()
 
     @handlers.json_action
     def reload_status(self, format):
@@ -10,6 +10,7 @@ from google.appengine.api import users
 import handlers
 from handlers.pager import QueryPager
 from models.package import Package
+from models.recent_packages import RecentPackages
 
 class Packages(object):
     """The handler for /packages/*.
@@ -25,26 +26,41 @@ class Packages(object):
         Arguments:
           page: The page of packages to get. Each page contains 10 packages.
         """
+        page = int(page)
         if format == 'json':
-            pager = QueryPager(int(page), "/packages.json?page=%d",
+            pager = QueryPager(page, "/packages.json?page=%d",
                                Package.all().order('-updated'),
-                               per_page=50)
+                               Package.listing_generation(),
+                               per_page=50, count=Package.total_count())
+            # The first page is served from the list of recent packages, so
+            # it doesn't need a query.
+            if page == 1:
+                names = [package['name']
+                         for package in RecentPackages.get_packages(50)]
+            else:
+                names = [package.name for package in pager.get_items()]
             return json.dumps({
                 "packages": [
-                    handlers.request().url(action='show', id=package.name)
-                    for package in pager.get_items()
+                    handlers.request().url(action='show', id=name)
+                    for name in names
                 ],
                 "prev": pager.prev_url,
                 "next": pager.next_url,
                 "pages": pager.page_count
             })
         else:
-            pager = QueryPager(int(page), "/packages?page=%d",
-                               Package.all().order('-updated'))
+            pager = QueryPager(page, "/packages?page=%d",
+                               Package.all().order('-updated'),
+                               Package.listing_generation(),
+                               count=Package.total_count())
+            if page == 1:
+                packages = RecentPackages.get_packages(10)
+            else:
+                packages = Package.prefetch_latest_versions(pager.get_items())
             title = 'All Packages'
             if page != 1: title = 'Page %s | %s' % (page, title)
             return handlers.render("packages/index",
-                                   packages=pager.get_items(),
+                                   packages=packages,
                                    pagination=pager.render_pagination(),
                                    layout={'title': title})
 
@@ -61,35 +77,47 @@ class Packages(object):
             })
         elif format == 'html':
             package = handlers.request().package
-            version_count = package.version_set.count()
+            page = package.get_cached_page(lambda: self._render_show(package))
+            return handlers.layout(page['content'], title=page['title'])
+        else:
+            raise handlers.http_error(404)
 
-            title = package.name
-            readme = None
-            readme_filename = None
-            changelog = None
-            changelog_filename = None
-            if package.latest_version:
-                title = '%s %s' % (package.name, package.latest_version.version)
+    def _render_show(self, package):
+        """Render the page describing a package, without the layout.
 
-                readme_obj = package.latest_version.readme_obj
-                if readme_obj:
-                    readme = readme_obj.render()
-                    readme_filename = readme_obj.filename
+        The page is the same for every user, so it's cached until the package
+        changes. See Package.get_cached_page.
 
-                changelog_obj = package.latest_version.changelog_obj
-                if changelog_obj:
-                    changelog = changelog_obj.render()
-                    changelog_filename = changelog_obj.filename
+        Returns: A map with the page's 'title' and its 'content'.
+        """
+        version_count = package.version_set.count()
 
-            return handlers.render(
-                "packages/show", package=package,
-                versions=package.version_set.order('-sort_order').fetch(10),
-                version_count=version_count,
-                show_versions_link=version_count > 10,
-                readme=readme,
-                readme_filename=readme_filename,
-                changelog=changelog,
-                changelog_filename=changelog_filename,
-                layout={'title': title})
-        else:
-            raise handlers.http_error(404)
+        title = package.name
+        readme = None
+        readme_filename = None
+        changelog = None
+        changelog_filename = None
+        if package.latest_version:
+            title = '%s %s' % (package.name, package.latest_version.version)
+
+            readme_obj = package.latest_version.readme_obj
+            if readme_obj:
+                readme = readme_obj.render()
+                readme_filename = readme_obj.filename
+
+            changelog_obj = package.latest_version.changelog_obj
+            if changelog_obj:
+                changelog = changelog_obj.render()
+                changelog_filename = changelog_obj.filename
+
+        content = handlers.render(
+            "packages/show", package=package,
+            versions=package.version_set.order('-sort_order').fetch(10),
+            version_count=version_count,
+            show_versions_link=version_count > 10,
+            readme=readme,
+            readme_filename=readme_filename,
+            changelog=changelog,
+            changelog_filename=changelog_filename,
+            layout=False)
+        return {'title': title, 'content': content}
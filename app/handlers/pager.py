@@ -4,6 +4,8 @@
 
 import math
 
+from google.appengine.api import memcache
+
 import handlers
 import cherrypy
 
@@ -148,9 +150,27 @@ class QueryPager(Pager):
     A new pager should be initialized for each page that is to be displayed. It
     determines which entities will be displayed and renders the pagination
     control.
+
+    Rather than skipping over every entity on the earlier pages, the pager
+    resumes from a query cursor saved when the previous page was displayed.
+    Cursors are cached in memcache under the href pattern and the generation
+    of the query's results, so each pattern must identify a single query, and
+    the generation must change whenever the query's results do.
+
+    Only the max_pages before the current page are searched for a cursor, and
+    a page's cursor is only cached once the page before it is displayed. Any
+    other page is fetched with an offset from the nearest cursor found, or from
+    the start of the query if there is none, which reads every entity skipped.
+    That's the case for page 2 of a listing whose first page isn't built by
+    this pager, and for the first deep page requested after the generation
+    changes. Pages after it are then cheap again.
     """
 
-    def __init__(self, page, href_pattern, query, per_page=10, max_pages=15):
+    _CURSOR_CACHE_TIME = 60 * 60
+    """How long, in seconds, to cache the cursor for each page."""
+
+    def __init__(self, page, href_pattern, query, generation, per_page=10,
+                 max_pages=15, count=None):
         """Create a new QueryPager.
 
         Arguments:
@@ -158,19 +178,57 @@ class QueryPager(Pager):
           href_pattern: The href for links to a given page. This should use "%d"
             where the page number should go.
           query: The Query object for the entities to paginate.
+          generation: A number that changes whenever the entities matched by
+            query or their order change, so that cursors saved for an older
+            result set aren't used.
           per_page: The number of entities to display on each page.
           max_pages: The maximum number of pages to display individually in the
             pagination control.
+          count: The total number of entities matched by query, if it's already
+            known. Otherwise, the query is counted each time a page is
+            displayed.
         """
 
         self._query = query
+        self._generation = generation
+        self._count = count
         super(QueryPager, self).__init__(page, href_pattern, per_page=per_page,
                                          max_pages=max_pages)
 
     def get_items(self):
         """Return a list of entities for the current page."""
-        offset = (self._page - 1) * self._per_page
-        return self._query.fetch(self._per_page, offset)
+        start_page, cursor = self._closest_cursor()
+        query = self._query
+        if cursor is not None: query = query.with_cursor(cursor)
+
+        offset = (self._page - start_page) * self._per_page
+        items = query.fetch(self._per_page, offset)
+
+        memcache.set(self._cursor_cache_key(self._page + 1), query.cursor(),
+                     time=QueryPager._CURSOR_CACHE_TIME)
+        return items
+
+    def _closest_cursor(self):
+        """Return the closest cached cursor at or before the current page.
+
+        This returns a (page, cursor) tuple, where cursor points to the first
+        entity of page. If no cursor is cached, this returns (1, None).
+        """
+        min_page = max(2, self._page - self._max_pages)
+        pages = range(self._page, min_page - 1, -1)
+        cursors = memcache.get_multi(
+            [self._cursor_cache_key(page) for page in pages])
+        for page in pages:
+            cursor = cursors.get(self._cursor_cache_key(page))
+            if cursor is not None: return page, cursor
+        return 1, None
+
+    def _cursor_cache_key(self, page):
+        """The memcache key for the cursor pointing to the start of page."""
+        return 'pager_cursor_%d_%d_%d_%s' % (
+            self._generation, self._per_page, page, self._href_pattern)
 
     def _get_count(self, max_item_to_count):
+        if self._count is not None:
+            return min(self._count, max_item_to_count + 1)
         return self._query.count(limit=max_item_to_count + 1)
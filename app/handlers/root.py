@@ -9,23 +9,28 @@ from google.appengine.api import users
 from handlers import cloud_storage
 from models.package_version import PackageVersion
 from models.private_key import PrivateKey
+from models.recent_packages import RecentPackages
 import handlers
 import cherrypy
-from models.package import Package
 
 class Root(object):
     """The handler for /*."""
 
     def index(self):
         """Retrieves the front page of the package server."""
-        packages = Package.all().order('-updated').fetch(5)
-        return handlers.render('index', recent_packages=packages)
+        return handlers.render(
+            'index', recent_packages=RecentPackages.get_packages(5))
 
     def authorized(self):
         """Retrieves the client authorization landing page."""
         return handlers.render(
             'authorized', layout={'title': 'Pub Authorized Successfully'})
 
+    def warmup(self):
+        """Prepares a new instance to serve requests."""
+        handlers.warm_up_templates()
+        return ''
+
     def site_map(self):
         """Retrieves a map of the site."""
         return handlers.render('site_map', layout={'title': 'Site Map'})
@@ -0,0 +1,95 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""URL routing for the pub.dartlang.org server."""
+
+import re
+
+import cherrypy
+import routes
+
+# Matches the first segment of a URL path, up to the first "/" or ".".
+_URL_PREFIX = re.compile(r"^/([^/.]*)")
+
+class Dispatcher(cherrypy.dispatch.RoutesDispatcher):
+    """A RoutesDispatcher that keeps the route it matched.
+
+    The match is stored as the "pub_route" attribute of the CherryPy request, so
+    that handlers.Request.route doesn't need to match the URL again.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(Dispatcher, self).__init__(*args, **kwargs)
+        self.mapper = PrefixMapper()
+        self.mapper.controller_scan = self.controllers.keys
+
+    def find_handler(self, path_info):
+        handler = super(Dispatcher, self).find_handler(path_info)
+        cherrypy.serving.request.pub_route = \
+            routes.request_config().mapper_dict
+        return handler
+
+class PrefixMapper(routes.Mapper):
+    """A routes.Mapper that only tries routes that can match a URL's prefix.
+
+    A plain Mapper checks each URL against a regexp that combines every route,
+    then tries every route in turn. This mapper instead groups the routes by
+    the literal first segment of their paths when its regexps are created. A
+    URL is only tried against the routes for its own first segment, along with
+    routes that don't begin with a literal segment, in their original order.
+    The first route that matches is the same one a plain Mapper would find.
+
+    The table is built by create_regs, so all routes must be connected before
+    the mapper is first used.
+    """
+
+    def _create_regs(self, *args, **kwargs):
+        super(PrefixMapper, self)._create_regs(*args, **kwargs)
+
+        table = {}
+        wildcards = []
+        for route in self.matchlist:
+            if route.static: continue
+            prefix = _route_prefix(route)
+            if prefix is None:
+                for prefix_routes in table.itervalues():
+                    prefix_routes.append(route)
+                wildcards.append(route)
+            else:
+                table.setdefault(prefix, list(wildcards)).append(route)
+
+        self._prefix_table = table
+        self._wildcard_routes = wildcards
+
+    def _match(self, url, environ):
+        url_prefix = _URL_PREFIX.match(url) if url else None
+        if not self._created_regs or self.always_scan or self.prefix or \
+                self.debug or url_prefix is None:
+            return super(PrefixMapper, self)._match(url, environ)
+
+        environ = environ or self.environ
+        candidates = self._prefix_table.get(
+            url_prefix.group(1), self._wildcard_routes)
+        for route in candidates:
+            match = route.match(url, environ, self.sub_domains,
+                                self.sub_domains_ignore, self.domain_match)
+            if isinstance(match, dict) or match: return (match, route, [])
+        return (None, None, [])
+
+def _route_prefix(route):
+    """Return the literal first segment of every URL route can match.
+
+    Returns None if the route's first segment isn't entirely literal, in which
+    case it may match URLs with any prefix.
+    """
+    if route.minimization or not route.routelist: return None
+    path = route.routelist[0]
+    if not isinstance(path, basestring) or not path.startswith('/'):
+        return None
+
+    prefix = re.match(r"[^/.]*", path[1:]).group(0)
+    # If a variable directly follows the literal text, it's part of the same
+    # segment.
+    if len(prefix) == len(path) - 1 and len(route.routelist) > 1: return None
+    return prefix
@@ -2,66 +2,34 @@
 # for details. All rights reserved. Use of this source code is governed by a
 # BSD-style license that can be found in the LICENSE file.
 
-import json
-import logging
-import re
+import hashlib
 import urllib
 
-from apiclient.discovery import build
+import cherrypy
+from google.appengine.api import memcache
+from google.appengine.ext import deferred
 
 import handlers
 from handlers.pager import Pager
+from models import search_index
 from models.package import Package
-from models.private_key import PrivateKey
-
-# The custom search ID for pub.dartlang.org.
-CUSTOM_SEARCH_ID = "009011925481577436976:h931xn2j7o0"
-
-PACKAGE_URL_PATTERN = re.compile(
-    r'https?://pub\.dartlang\.org/packages/([a-z0-9_]+)')
 
 RESULTS_PER_PAGE = 10
 
-# The Custom Search API limits to 100 results and generates an error if
-# we request beyond that.
-MAX_RESULTS = 100
-
-# The Custom Search Client API service. This will be lazily initialized the
-# first time it is used.
-_search_service = None
-
-# This is set by set_mock_resource() so that the tests do not hit the actual
-# Custom Search API.
-_mock_resource = None
-
-def set_mock_resource(resource):
-    """Set this to mock the Custom Search API.
-
-    After calling this, instead of calling the actual Custom Search API, the
-    given resources will be used as the result of the API call.
-    """
-    global _mock_resource
-    _mock_resource = resource
+# How long (in seconds) a page of search results is cached.
+_RESULTS_CACHE_TIME = 5 * 60
 
 class Search(object):
     """The handler for /search.
 
-    Calls the Custom Search API and formats and displays the results. The
-    search is filtered to only include URLs within pub.dartlang.org/packages,
-    which are the kind of results.
-
-    However, since the Google spider only crawls pub periodically, the results
-    are often out of date. The result snippet may describe an older version of
-    the package. To avoid that, and to provide a more nicely integrated design,
-    we perform the search on the server using the Google client API.
-
-    We then take those results and look through the result URLs. For each one,
-    we get the package it's for and then look up the live metadata for the
-    latest version of that package directly from the data store. Then we render
-    the result ourselves.
+    Queries are run against the app's own search index (see
+    models.search_index), which is updated by a task whenever a package's
+    latest version changes. Results aren't live, though: each page of results
+    is cached for _RESULTS_CACHE_TIME (five minutes), and may have been built
+    from term postings that an instance cached up to a minute before. So a
+    change can take about six minutes after it's indexed to show up in search.
     """
 
-    @handlers.requires_api_key
     def index(self, q, page=1):
         """Format and display a list of search results.
 
@@ -70,6 +38,8 @@ class Search(object):
           page: The page of results to get. Each page contains 10 results.
         """
         page = int(page)
+        if page < 1:
+            handlers.http_error(400, "Page \"%d\" is out of bounds." % page)
 
         results, count = self._query_search(q, page)
         pager = SearchPager(page, q, count)
@@ -81,96 +51,75 @@ class Search(object):
              pagination=pager.render_pagination(),
              layout={'title': 'Search Results for "' + q + '"'})
 
+    def reindex(self):
+        """Rebuild the search index for every package.
+
+        This runs in the background, in a chain of tasks. It's needed after the
+        index is first deployed, and after changes to how packages are scored.
+        """
+        if not handlers.is_current_user_dogfooder(): handlers.http_error(403)
+        deferred.defer(search_index.reindex)
+        raise cherrypy.HTTPRedirect('/admin#tab-packages')
+
     def _query_search(self, query, page):
-        """Call the Custom Search API with the given query and get the given
-        page of results.
+        """Get the given page of results for a query.
 
         Return a tuple. The first element is the list of search results for the
         requested page. Each result is a map that can be passed to the search
         result template. The second element is the total count of search
-        results. The count will always be the total count of all results
-        starting from the beginning, regardless of the page being requested.
-
-        For each search result, this looks up the actual package in the data
-        store and returns its live metadata. If the URL cannot be parsed or
-        the package cannot be found in the datastore, it is not included in the
         results.
 
+        Pages of results are cached for a few minutes, keyed by the query's
+        normal form, so repeated and popular queries are served with a single
+        memcache lookup.
+
         Arguments:
           query: The search query to perform.
-          page: The page of results to return. If out of bounds, returns an
-            empty collection of results.
+          page: The page of results to return.
         """
-        global _search_service
-
-        if page < 1 or page > MAX_RESULTS / RESULTS_PER_PAGE:
-            handlers.http_error(400, "Page \"%d\" is out of bounds." % page)
-
-        start = (page - 1) * RESULTS_PER_PAGE + 1
-
-        results = []
-        if _mock_resource:
-            resource = _mock_resource
-        else:
-            if not _search_service:
-                _search_service = build("customsearch", "v1",
-                                        developerKey=PrivateKey.get_api())
-            resource = _search_service.cse().list(q=query, cx=CUSTOM_SEARCH_ID,
-                num=RESULTS_PER_PAGE, start=start).execute()
-
-        if "items" in resource:
-            for item in resource["items"]:
-                result = self._get_result(item)
-                if result: results.append(result)
+        cache_key = 'search_%s_%d' % (hashlib.sha1(
+            search_index.normalize_query(query)).hexdigest(), page)
+        cached = memcache.get(cache_key)
+        if cached is not None: return cached
 
-        count = int(resource["searchInformation"]["totalResults"])
-        return results, count
+        names = search_index.search(query)
+        start = (page - 1) * RESULTS_PER_PAGE
+        value = (self._get_results(names[start:start + RESULTS_PER_PAGE]),
+                 len(names))
+        memcache.set(cache_key, value, time=_RESULTS_CACHE_TIME)
+        return value
 
-    def _get_result(self, resource_item):
-        """Convert a Custom Search API result into a map of package metadata
-        that can be rendered.
+    def _get_results(self, names):
+        """Load the packages with the given names as renderable results.
 
-        If the result does not reference a valid package, return None.
+        Each result is a map that can be passed to the search result template.
+        Packages that can't be found in the datastore are left out.
 
         Arguments:
-          resource_item: The API result. It is expected to be a map containing
-            a "link" key which will likely be a package URL.
+          names: The names of the packages to load, in order.
         """
-        link = resource_item["link"]
-        match = PACKAGE_URL_PATTERN.match(link)
-        if not match:
-            logging.warning('could not parse search result URL "%s"' % link)
-            return None
-
-        package = Package.get_by_key_name(match.group(1))
-        if not package:
-            logging.warning('could not find search result package "%s"' %
-                match.group(1))
-            return None
-
-        return {
+        packages = Package.prefetch_latest_versions(
+            package for package in Package.get_by_key_name(names)
+            if package is not None)
+        return [{
             "name": package.name,
-            "version": package.latest_version.version,
+            "version": str(package.latest_version.version),
             "desc": package.ellipsized_description,
             "url": "/packages/" + package.name,
             "last_uploaded": package.latest_version.relative_created
-        }
+        } for package in packages if package.latest_version is not None]
 
 
 class SearchPager(Pager):
-    """A class for paginating a Google Custom Search API call."""
+    """A class for paginating search results."""
 
     def __init__(self, page, query, count):
         """Create a new SearchPager.
 
         Arguments:
-          page: The page of entities to get. One-based.
-          href_pattern: The href for links to a given page. This should use "%d"
-            where the page number should go.
-          query: The Query object for the entities to paginate.
-          per_page: The number of entities to display on each page.
-          max_pages: The maximum number of pages to display individually in the
-            pagination control.
+          page: The page of results to get. One-based.
+          query: The search query.
+          count: The total number of results.
         """
 
         self._query = query
@@ -180,4 +129,4 @@ class SearchPager(Pager):
                                           per_page=RESULTS_PER_PAGE)
 
     def _get_count(self, max_item_to_count):
-        return min(self._count, max_item_to_count, MAX_RESULTS)
+        return min(self._count, max_item_to_count + 1)
@@ -4,7 +4,6 @@
 
 """This module provides utility functions for models."""
 
-from contextlib import contextmanager
 import datetime
 import re
 
@@ -14,14 +13,6 @@ import routes
 from decorator import decorator
 from google.appengine.ext import db
 
-@contextmanager
-@db.transactional
-def transaction():
-    """Run a block of code in a transaction.
-
-    Meant to be used with the 'with' keyword."""
-    yield
-
 @decorator
 def transactional(fn, *args, **kwargs):
     """Like db.transactional, but preserves the original method signature.
@@ -29,7 +20,7 @@ def transactional(fn, *args, **kwargs):
     This is useful for wrapping handler actions, since CherryPy inspects the
     parameters to determine when to return a 404 response.
     """
-    with transaction(): return fn(*args, **kwargs)
+    return db.run_in_transaction(fn, *args, **kwargs)
 
 _ELLIPSIZE_RE = re.compile(r"(\s+[^\s]*)?$")
 
@@ -0,0 +1,61 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+from google.appengine.api import memcache
+from google.appengine.ext import db
+
+class Counter(db.Model):
+    """A named count that's kept up to date as the things it counts change.
+
+    Counting the results of a query gets slower as the number of results grows,
+    so counts that are needed on every request are stored here instead. The
+    key name of each counter is its name.
+
+    Counters are initialized lazily by get_count(). Incrementing a counter that
+    hasn't been initialized does nothing, since the initial count will include
+    whatever was added.
+    """
+
+    count = db.IntegerProperty(required=True, default=0, indexed=False)
+    """The current value of the counter."""
+
+    @classmethod
+    def get_count(cls, name, initial):
+        """Return the value of a counter.
+
+        Arguments:
+          name: The name of the counter.
+          initial: A function that computes the count from scratch. This is
+            only called if the counter hasn't been initialized yet.
+        """
+        cache_key = cls._cache_key(name)
+        count = memcache.get(cache_key)
+        if count is not None: return count
+
+        counter = cls.get_by_key_name(name)
+        if counter is None:
+            # Another request may have initialized the counter while this one
+            # was computing the count, and it may have been incremented since,
+            # so the counter is only stored if it still doesn't exist.
+            counter = cls.get_or_insert(name, count=initial())
+
+        memcache.set(cache_key, counter.count)
+        return counter.count
+
+    @classmethod
+    def increment(cls, name, delta=1):
+        """Add delta to the value of a counter."""
+        def txn():
+            counter = cls.get_by_key_name(name)
+            if counter is None: return
+            counter.count += delta
+            counter.put()
+
+        db.run_in_transaction(txn)
+        memcache.delete(cls._cache_key(name))
+
+    @classmethod
+    def _cache_key(cls, name):
+        """The memcache key for the value of a counter."""
+        return 'counter_' + name
@@ -0,0 +1,156 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+import random
+
+from google.appengine.api import memcache
+from google.appengine.ext import db
+from google.appengine.ext import deferred
+
+from package import Package
+from package_version import PackageVersion
+
+# The number of shards each package version's downloads are spread across.
+_SHARDS = 20
+
+# How long (in seconds) downloads are buffered in memcache before they're
+# written to a shard.
+_FLUSH_DELAY = 60
+
+# The maximum number of shards rolled up in a single transaction. Each shard is
+# its own entity group, and the package's entity group needs a slot as well.
+_ROLL_UP_BATCH_SIZE = 24
+
+class DownloadShard(db.Model):
+    """Downloads of a package version that haven't been rolled up yet.
+
+    Downloads are recorded in three stages, so that serving a download never
+    writes to the datastore and no entity is written too often:
+
+    - record() increments a counter for the version in memcache, and the first
+      download in a while enqueues a task to flush it.
+    - That task moves the buffered count into one of several shards for the
+      version, chosen at random.
+    - roll_up(), which runs on a schedule, adds the shards' counts to the
+      PackageVersion.downloads and Package.downloads totals and resets them.
+
+    Downloads buffered in memcache are lost if they're evicted before they're
+    flushed, so the totals are a close lower bound rather than an exact count.
+    """
+
+    package_name = db.StringProperty(required=True, indexed=False)
+    """The name of the package that was downloaded."""
+
+    version = db.StringProperty(required=True, indexed=False)
+    """The canonical version that was downloaded."""
+
+    count = db.IntegerProperty(required=True, default=0)
+    """The number of downloads that haven't been rolled up."""
+
+    @classmethod
+    def record(cls, package_name, version):
+        """Record a download of a package version.
+
+        This doesn't write to the datastore.
+
+        Arguments:
+          package_name: The name of the package.
+          version: The canonical version that was downloaded.
+        """
+        count = memcache.incr(cls._cache_key(package_name, version),
+                              initial_value=0)
+        if count == 1:
+            deferred.defer(cls._flush, package_name, version,
+                           _countdown=_FLUSH_DELAY)
+
+    @classmethod
+    def _flush(cls, package_name, version):
+        """Move buffered downloads of a package version into a shard.
+
+        The buffered count is taken out of memcache before the shard is written
+        and put back if the write fails, so that a retry of this task can't add
+        the same downloads to a shard twice.
+        """
+        cache_key = cls._cache_key(package_name, version)
+        count = memcache.get(cache_key)
+        if not count: return
+
+        # If the counter was evicted, its downloads are lost.
+        remaining = memcache.decr(cache_key, count)
+        if remaining is None: return
+
+        key_name = '%s/%s/%d' % (package_name, version,
+                                 random.randint(0, _SHARDS - 1))
+        def txn():
+            shard = cls.get_by_key_name(key_name)
+            if shard is None:
+                shard = cls(key_name=key_name, package_name=package_name,
+                            version=version)
+            shard.count += count
+            shard.put()
+
+        try:
+            db.run_in_transaction(txn)
+        except:
+            memcache.incr(cache_key, count, initial_value=0)
+            raise
+
+        # Downloads recorded since the count was read don't enqueue a flush of
+        # their own, so flush them now.
+        if remaining:
+            deferred.defer(cls._flush, package_name, version,
+                           _countdown=_FLUSH_DELAY)
+
+    @classmethod
+    def roll_up(cls):
+        """Add the downloads in all shards to the package and version totals.
+
+        Each package's full API document is rebuilt afterwards, so that the
+        next request for it doesn't have to. This must be run within a
+        request, since the document contains absolute URLs.
+        """
+        by_package = {}
+        for key in cls.all(keys_only=True).filter('count >', 0).run():
+            package_name = key.name().split('/', 1)[0]
+            by_package.setdefault(package_name, []).append(key)
+
+        for package_name, keys in by_package.iteritems():
+            package = None
+            for i in range(0, len(keys), _ROLL_UP_BATCH_SIZE):
+                package = cls._roll_up_package(
+                    package_name, keys[i:i + _ROLL_UP_BATCH_SIZE]) or package
+            if package is not None: package.update_full_document()
+
+    @classmethod
+    @db.transactional(xg=True)
+    def _roll_up_package(cls, package_name, keys):
+        """Roll up some of the download shards for a single package.
+
+        Returns: The updated Package, or None if it doesn't exist.
+        """
+        package = Package.get_by_key_name(package_name)
+        if package is None: return
+
+        versions = {}
+        shards = [shard for shard in cls.get(keys) if shard and shard.count]
+        for shard in shards:
+            if shard.version not in versions:
+                versions[shard.version] = PackageVersion.get_by_key_name(
+                    shard.version, parent=package)
+            version = versions[shard.version]
+            if version is not None: version.downloads += shard.count
+            package.downloads += shard.count
+            shard.count = 0
+
+        # Downloads are part of the package's full API document, but nothing
+        # else that's cached for the package.
+        package.record_downloads()
+        db.put([package] + [version for version in versions.itervalues()
+                            if version is not None] + shards)
+        return package
+
+    @classmethod
+    def _cache_key(cls, package_name, version):
+        """The memcache key for buffered downloads of a package version."""
+        return 'downloads_%s_%s' % (package_name, version)
@@ -0,0 +1,65 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+from collections import OrderedDict
+import threading
+import time
+
+class LRUCache(object):
+    """An in-process cache that discards the least recently used entries.
+
+    The cache is shared by all requests handled by an instance, so it's safe to
+    use from multiple threads at once.
+    """
+
+    def __init__(self, capacity, ttl=None):
+        """Create a new LRUCache.
+
+        Arguments:
+          capacity: The maximum number of entries to hold.
+          ttl: The number of seconds after which an entry expires, or None if
+            entries should only be discarded when the cache is full.
+        """
+        self._capacity = capacity
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value for key, or default if it isn't cached."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None: return default
+
+            value, expires = entry
+            if expires is not None and expires <= time.time(): return default
+
+            # Re-inserting the entry marks it as the most recently used.
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value):
+        """Cache value under key."""
+        expires = None
+        if self._ttl is not None: expires = time.time() + self._ttl
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, expires)
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Discard the value for key, if there is one."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Discard all cached values."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -11,7 +11,16 @@ from google.appengine.api import users
 from google.appengine.ext import db
 
 import models
+from counter import Counter
+from package_document import PackageDocument, gunzip
 from pubspec import Pubspec
+from semantic_version import SemanticVersion
+from version_constraint import version_index
+
+# How long (in seconds) a package's cache validators are kept in memcache. A
+# reader that races with a change can cache outdated validators, so this bounds
+# how long they can be served.
+_VALIDATORS_CACHE_TIME = 60
 
 class Package(db.Model):
     """The model for a package.
@@ -21,8 +30,9 @@ class Package(db.Model):
     package is represented by a PackageVersion model.
 
     Whenever a new PackageVersion for a Package is added or modified, you must
-    call invalidate_cache() to ensure any stale cached description of the
-    package is discarded.
+    call invalidate_cache() before saving the package to ensure any stale
+    cached description of the package is discarded, then call
+    update_document() once the change has been committed.
     """
 
     MAX_SIZE = 100 * 2**20 # 100MB
@@ -49,6 +59,20 @@ class Package(db.Model):
 
     When this is set, invalidate_cache() must be called."""
 
+    generation = db.IntegerProperty(default=0, indexed=False)
+    """A counter that's incremented each time the package's API document changes.
+
+    This is managed by invalidate_cache(). It's used to tell whether cached and
+    stored descriptions of the package are up to date."""
+
+    downloads_generation = db.IntegerProperty(default=0, indexed=False)
+    """A counter that's incremented each time download counts are rolled up.
+
+    Download counts only appear in the full API document, so they're tracked
+    separately from generation, and rolling them up doesn't invalidate the
+    package's other cached descriptions. This is managed by record_downloads().
+    """
+
     @property
     def description(self):
         """The short description of the package."""
@@ -139,6 +163,35 @@ class Package(db.Model):
 
         return cls(**kwargs)
 
+    @classmethod
+    def total_count(cls):
+        """Return the total number of packages.
+
+        This is maintained as packages are created, so it doesn't get slower
+        as the number of packages grows.
+        """
+        return Counter.get_count(
+            'packages', lambda: cls.all(keys_only=True).count(limit=None))
+
+    @classmethod
+    def increment_total_count(cls):
+        """Record that a new package has been created."""
+        Counter.increment('packages')
+
+    @classmethod
+    def listing_generation(cls):
+        """Return a number that changes whenever a package's update time does.
+
+        Listings of packages in order of update time can cache anything derived
+        from their order, such as query cursors, under this number.
+        """
+        return Counter.get_count('package_updates', lambda: 0)
+
+    @classmethod
+    def increment_listing_generation(cls):
+        """Record that a package's latest version has changed."""
+        Counter.increment('package_updates')
+
     @db.ComputedProperty
     def updated(self):
         """When the latest version of this package was uploaded.
@@ -147,6 +200,31 @@ class Package(db.Model):
         will not affect this field."""
         return self.latest_version and self.latest_version.created
 
+    @classmethod
+    def prefetch_latest_versions(cls, packages):
+        """Load the latest versions of many packages at once.
+
+        Dereferencing latest_version loads the version from the datastore, so
+        doing so for each package in a listing makes a round trip per package.
+        This instead loads all the versions in a single batch get and attaches
+        them to their packages. Each version's package is attached as well, so
+        that dereferencing it doesn't load the package again.
+
+        Returns: The list of packages.
+        """
+        packages = list(packages)
+        keys = [Package.latest_version.get_value_for_datastore(package)
+                for package in packages]
+        versions = dict((version.key(), version) for version
+                        in db.get(set(key for key in keys if key is not None))
+                        if version is not None)
+        for package, key in zip(packages, keys):
+            if key not in versions: continue
+            version = versions[key]
+            Package.latest_version.__set__(package, version)
+            if key.parent() == package.key(): version.package = package
+        return packages
+
     @classmethod
     def exists(cls, name):
         """Determine whether a package with the given name exists."""
@@ -199,45 +277,391 @@ class Package(db.Model):
                 'created': self.created.isoformat(),
                 'downloads': self.downloads,
                 'uploaders': [email for email in self.uploaderEmails],
-                'versions': [version.as_dict() for version in self.version_set]
+                'versions': [version.as_dict() for version in self.versions()]
             })
 
         return value
 
-    def as_json(self):
+    def versions(self):
+        """Returns a list of all versions of this package, ordered by key.
+
+        Unlike version_set, this uses an ancestor query, so it's strongly
+        consistent and may be run in a transaction. Each version's package
+        reference is pointed at this object so that it doesn't need to be
+        loaded separately for each version.
+        """
+        from package_version import PackageVersion
+        versions = list(PackageVersion.all().ancestor(self).run())
+        for version in versions: version.package = self
+        return versions
+
+    def as_json(self, compressed=False):
         """Returns the JSON stringified representation of the full information
         for this package.
+
+        This is read from memcache if possible, and otherwise from the
+        PackageDocument stored by update_document(). The document is only built
+        here if it's missing or out of date, which happens for packages that
+        haven't changed since documents were introduced and after versions are
+        reloaded outside of a request.
+
+        If compressed is True, the document is returned compressed with gzip.
+        Only the compressed form is cached, so that each document only takes up
+        as much of memcache as it needs to, and it's decompressed for clients
+        that don't accept gzip.
         """
         cached = memcache.get(self._package_json_cache_key)
-        if cached:
+        if cached is not None and _generations(cached) == \
+                (self.generation or 0, self.downloads_generation or 0):
             logging.info("Found cached " + self._package_json_cache_key)
-            return cached
+            if compressed: return cached['gzipped']
+            return gunzip(cached['gzipped'])
+
+        document = PackageDocument.get_for(self)
+        if document is None or not document.describes(self):
+            logging.warning("Stored document for %s is missing or stale" %
+                            self.name)
+            document = self.update_document()
 
-        value = json.dumps(self.as_dict(full=True))
+        gzipped = document.get_gzipped_json()
         logging.info("Setting memcache key: " + self._package_json_cache_key)
-        memcache.set(self._package_json_cache_key, value)
-        return value
+        memcache.set(self._package_json_cache_key,
+                     self._json_cache_entry(gzipped))
+        return gzipped if compressed else document.json
+
+    def as_versions_json(self, since=None):
+        """Returns the compact JSON document listing this package's versions.
+
+        This is meant for dependency solvers, which only need to know what
+        versions exist and what they depend on. It's an object with the
+        package's "name" and "generation", and a list of "versions". Each
+        version has its "version", its "sdk" constraint, its "dependencies",
+        and the "generation" of the package when it was last changed.
+
+        Like as_json(), this is read from memcache or from a stored
+        PackageDocument if possible.
+
+        Arguments:
+          since: If this is passed, only versions that have changed since the
+            given generation are listed.
+        """
+        cache_key = self._versions_json_cache_key
+        document = memcache.get(cache_key)
+        if document is None:
+            stored = PackageDocument.get_for(self, kind='versions')
+            if stored is None or stored.generation != self.generation:
+                logging.warning("Stored versions document for %s is missing "
+                                "or stale" % self.name)
+                stored = self.update_versions_document()
+            document = stored.json
+            memcache.set(cache_key, document)
+
+        if since is None: return document
+        value = json.loads(document)
+        value['versions'] = [version for version in value['versions']
+                             if version['generation'] > since]
+        return json.dumps(value, separators=(',', ':'))
+
+    def get_cached_page(self, render):
+        """Return the HTML page describing this package.
+
+        The page (minus the layout, which varies by user) is cached in
+        memcache until invalidate_cache() is next called.
+
+        Arguments:
+          render: A function that renders the page if it's not cached. It
+            should return a map with the page's 'title' and its 'content'.
+        """
+        page = memcache.get(self._package_page_cache_key)
+        if page is not None: return page
+
+        page = render()
+        memcache.set(self._package_page_cache_key, page)
+        return page
+
+    @classmethod
+    def get_validators(cls, name):
+        """Return the cache validators for a package's documents.
+
+        This is a map with keys 'generation', 'downloads_generation' and
+        'updated': the package's generations and when it was last updated.
+        It's read from memcache if possible, so that checking whether a
+        client's copy of a document is current doesn't usually touch the
+        datastore.
+
+        Returns None if the package doesn't exist.
+        """
+        return cls.get_validators_multi([name]).get(name)
+
+    @classmethod
+    def get_validators_multi(cls, names):
+        """Return the cache validators for many packages at once.
+
+        This uses a single memcache call, and a single datastore get for any
+        packages whose validators aren't cached. See get_validators.
+
+        Returns: A map from package names to validators. Packages that don't
+          exist are omitted.
+        """
+        cache_keys = dict((cls._validators_cache_key(name), name)
+                          for name in names)
+        validators = dict((cache_keys[key], value) for key, value
+                          in memcache.get_multi(cache_keys.keys()).iteritems())
+
+        missing = [name for name in set(names) if name not in validators]
+        if not missing: return validators
+
+        fresh = {}
+        for name, (package, document) in \
+                cls._get_with_documents(missing).iteritems():
+            validators[name] = cls._validators(package, document)
+            fresh[cls._validators_cache_key(name)] = validators[name]
+        memcache.set_multi(fresh, time=_VALIDATORS_CACHE_TIME)
+        return validators
+
+    @classmethod
+    def get_json_multi(cls, names):
+        """Return the full JSON documents for many packages at once.
+
+        This is the batch equivalent of as_json(). The packages' validators and
+        cached documents are read from memcache in a single call. Anything
+        that isn't cached is read in a single datastore get of the packages and
+        their stored PackageDocuments. Only documents that are missing or out
+        of date are built one package at a time.
+
+        Returns: A map from package names to JSON documents. Packages that don't
+          exist are omitted.
+        """
+        names = list(set(names))
+        cached = memcache.get_multi(
+            [cls._validators_cache_key(name) for name in names] +
+            [cls._json_cache_key(name) for name in names])
+
+        documents = {}
+        missing = []
+        for name in names:
+            validators = cached.get(cls._validators_cache_key(name))
+            entry = cached.get(cls._json_cache_key(name))
+            if validators is not None and entry is not None and \
+                    _generations(entry) == _generations(validators):
+                documents[name] = gunzip(entry['gzipped'])
+            else:
+                missing.append(name)
+        if not missing: return documents
+
+        fresh_validators = {}
+        fresh_documents = {}
+        for name, (package, document) in \
+                cls._get_with_documents(missing).iteritems():
+            if document is None or not document.describes(package):
+                documents[name] = package.as_json()
+                continue
+
+            documents[name] = document.json
+            fresh_validators[cls._validators_cache_key(name)] = \
+                cls._validators(package, document)
+            fresh_documents[cls._json_cache_key(name)] = \
+                package._json_cache_entry(document.get_gzipped_json())
+        memcache.set_multi(fresh_validators, time=_VALIDATORS_CACHE_TIME)
+        memcache.set_multi(fresh_documents)
+        return documents
+
+    @classmethod
+    def _get_with_documents(cls, names):
+        """Load packages and their full documents in a single datastore get.
+
+        Returns: A map from the names of the packages that exist to
+          (package, document) pairs. The document is None if it hasn't been
+          stored.
+        """
+        keys = [db.Key.from_path(cls.kind(), name) for name in names] + \
+            [PackageDocument.key_for(name) for name in names]
+        entities = db.get(keys)
+        return dict((name, (package, document)) for name, package, document
+                    in zip(names, entities[:len(names)], entities[len(names):])
+                    if package is not None)
+
+    @classmethod
+    def _validators(cls, package, document):
+        """Return the cache validators for a package.
+
+        When the package was updated is read from its full document if that's
+        up to date, so that the package's latest version doesn't need to be
+        loaded.
+
+        Arguments:
+          package: The package.
+          document: The package's full PackageDocument, or None.
+        """
+        if document is not None and document.updated is not None and \
+                document.generation == (package.generation or 0):
+            updated = document.updated
+        else:
+            updated = package.updated
+        return {'generation': package.generation or 0,
+                'downloads_generation': package.downloads_generation or 0,
+                'updated': updated}
+
+    @classmethod
+    def get_version_index(cls, name, generation):
+        """Return the index of a package's versions.
+
+        This is the index built by version_constraint.version_index(). It's
+        cached in memcache for each generation of the package, so it's rebuilt
+        whenever invalidate_cache() is called.
+
+        Arguments:
+          name: The name of the package.
+          generation: The package's current generation.
+        """
+        cache_key = cls._version_index_cache_key(name, generation)
+        index = memcache.get(cache_key)
+        if index is not None: return index
+
+        # Each version's key name is its canonical version, so the index can
+        # be built without loading the versions themselves.
+        from package_version import PackageVersion
+        query = PackageVersion.all(keys_only=True) \
+            .ancestor(db.Key.from_path('Package', name))
+        index = version_index(SemanticVersion(key.name())
+                              for key in query.run(batch_size=1000))
+        memcache.set(cache_key, index)
+        return index
+
+    def update_document(self):
+        """Builds and stores the API document for the current generation.
+
+        This should be called after a change to the package has been
+        committed, so that API requests can read a finished document rather
+        than building one. It must be run within a request, since the document
+        contains absolute URLs.
+
+        Returns the stored PackageDocument.
+        """
+        # A request that read the package before the change was committed may
+        # have cached the old validators.
+        memcache.delete(self._validators_cache_key(self.name))
+        self.update_versions_document()
+        return self.update_full_document()
+
+    def update_full_document(self):
+        """Builds and stores the full API document.
+
+        Unlike update_document(), this doesn't rebuild the compact versions
+        document, which doesn't include download counts, so this is all that's
+        needed after record_downloads(). Like update_document(), it must be run
+        within a request.
+
+        Returns the stored PackageDocument.
+        """
+        return PackageDocument.store(self, json.dumps(self.as_dict(full=True)))
+
+    def update_versions_document(self):
+        """Builds and stores the compact versions document.
+
+        See as_versions_json(). This is built incrementally from the stored
+        document for an earlier generation, so that each version keeps the
+        generation it was last changed in.
+
+        Returns the stored PackageDocument.
+        """
+        previous = PackageDocument.get_for(self, kind='versions')
+        previous_versions = {}
+        if previous is not None:
+            for version in json.loads(previous.json)['versions']:
+                previous_versions[version['version']] = version
+
+        versions = []
+        for version in sorted(self.versions(),
+                              key=lambda version: version.version):
+            environment = version.pubspec.get('environment')
+            value = {
+                'version': str(version.version),
+                'sdk': environment.get('sdk')
+                    if isinstance(environment, dict) else None,
+                'dependencies': version.pubspec.get('dependencies') or {}
+            }
+
+            old = previous_versions.get(value['version'])
+            if old is not None and \
+                    all(old.get(key) == value[key] for key in value):
+                value['generation'] = old['generation']
+            else:
+                value['generation'] = self.generation or 0
+            versions.append(value)
+
+        return PackageDocument.store(self, json.dumps({
+            'name': self.name,
+            'generation': self.generation or 0,
+            'versions': versions
+        }, separators=(',', ':')), kind='versions')
 
     def invalidate_cache(self):
-        """Clears the cached JSON for the package.
+        """Marks the cached descriptions of this package as out of date.
 
         This must be called any time any data that is in the JSON for the full
         description of the package changes. This isn't often since most package
         data is immutable, but when the uploader list changes or new versions
         of the package are uploaded, the data will change.
+
+        This increments the package's generation, so it must be called before
+        the package is saved.
         """
         logging.info("Invalidating memcache keys: %s and %s"
                      % (self._package_json_cache_key,
                         self._dart_package_json_cache_key))
 
         memcache.delete(self._package_json_cache_key)
+        memcache.delete(self._versions_json_cache_key)
+        memcache.delete(self._version_index_cache_key(
+            self.name, self.generation or 0))
         memcache.delete(self._dart_package_json_cache_key)
         memcache.delete(self._dart_package_ui_cache_key)
+        memcache.delete(self._package_page_cache_key)
+        memcache.delete(self._validators_cache_key(self.name))
+        self.generation = (self.generation or 0) + 1
+
+    def record_downloads(self):
+        """Marks the download counts of this package as out of date.
+
+        This must be called whenever the downloads of this package or any of
+        its versions change, before the package is saved. Download counts only
+        appear in the full API document, so unlike invalidate_cache(), this
+        leaves the package's generation and everything cached for it alone.
+        """
+        memcache.delete_multi([self._package_json_cache_key,
+                               self._validators_cache_key(self.name)])
+        self.downloads_generation = (self.downloads_generation or 0) + 1
 
     @property
     def _package_json_cache_key(self):
-        """The memcache key for the cached JSON for this package."""
-        return 'package_json_' + self.name
+        """The memcache key for the cached JSON for this package.
+
+        The cached value is built by _json_cache_entry(). It holds the document
+        compressed with gzip, and records the generations it was built for. A
+        reader that races with a writer can cache a stale document under this
+        key, so the generations are checked whenever it's read.
+        """
+        return self._json_cache_key(self.name)
+
+    @classmethod
+    def _json_cache_key(cls, name):
+        """The memcache key for the cached JSON for the named package."""
+        return 'package_json_' + name
+
+    def _json_cache_entry(self, gzipped):
+        """Return the memcache value for this package's gzipped document."""
+        return {'generation': self.generation or 0,
+                'downloads_generation': self.downloads_generation or 0,
+                'gzipped': gzipped}
+
+    @property
+    def _versions_json_cache_key(self):
+        """The memcache key for the compact versions document for this package.
+
+        Like _package_json_cache_key, this includes the package's generation.
+        """
+        return 'package_versions_json_%s_%d' % (self.name, self.generation or 0)
 
     @property
     def _dart_package_json_cache_key(self):
@@ -248,3 +672,25 @@ class Package(db.Model):
     def _dart_package_ui_cache_key(self):
         """The Dart memcache key for the cached UI page for this package."""
         return 'dart_package_ui' + self.name
+
+    @property
+    def _package_page_cache_key(self):
+        """The memcache key for the cached HTML page for this package.
+
+        Like _package_json_cache_key, this includes the package's generation.
+        """
+        return 'package_page_%s_%d' % (self.name, self.generation or 0)
+
+    @classmethod
+    def _validators_cache_key(cls, name):
+        """The memcache key for the cache validators of the named package."""
+        return 'package_validators_' + name
+
+    @classmethod
+    def _version_index_cache_key(cls, name, generation):
+        """The memcache key for the version index of a package generation."""
+        return 'package_versions_index_%s_%d' % (name, generation)
+
+def _generations(value):
+    """Return the generations recorded in validators or a cached document."""
+    return (value['generation'], value['downloads_generation'])
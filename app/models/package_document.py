@@ -0,0 +1,107 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+import zlib
+
+from google.appengine.ext import db
+
+class PackageDocument(db.Model):
+    """A precomputed API document describing a package.
+
+    Building the full description of a package touches every one of its
+    versions, so rather than doing so whenever a request needs it, the document
+    is built once each time the package changes and stored here.
+
+    Each document is a child of the Package it describes. Its key name
+    identifies the kind of document, which allows a package to have several
+    representations stored side by side.
+    """
+
+    generation = db.IntegerProperty(required=True, indexed=False)
+    """The Package.generation this document was built from."""
+
+    downloads_generation = db.IntegerProperty(default=0, indexed=False)
+    """The Package.downloads_generation this document was built from."""
+
+    updated = db.DateTimeProperty(indexed=False)
+    """When the package's latest version was uploaded, as of this document.
+
+    This is None for documents stored before it was recorded."""
+
+    json = db.BlobProperty(required=True)
+    """The JSON-encoded document."""
+
+    gzipped_json = db.BlobProperty()
+    """The JSON-encoded document, compressed with gzip.
+
+    This is None for documents stored before compressed documents were."""
+
+    def describes(self, package):
+        """Whether this document is up to date for package.
+
+        Only the full document includes download counts, so other kinds of
+        document only need to match the package's generation.
+        """
+        if self.generation != (package.generation or 0): return False
+        return self.key().name() != 'full' or \
+            (self.downloads_generation or 0) == \
+            (package.downloads_generation or 0)
+
+    def get_gzipped_json(self):
+        """Return the JSON-encoded document, compressed with gzip."""
+        return self.gzipped_json or gzip(self.json)
+
+    @classmethod
+    def get_for(cls, package, kind='full'):
+        """Load the document of the given kind for a package, or None."""
+        return cls.get_by_key_name(kind, parent=package)
+
+    @classmethod
+    def key_for(cls, package_name, kind='full'):
+        """Return the key of the document of the given kind for a package."""
+        return db.Key.from_path('Package', package_name, cls.kind(), kind)
+
+    @classmethod
+    def store(cls, package, json, kind='full'):
+        """Store a newly-built document for a package.
+
+        The document is assumed to describe package.generation and
+        package.downloads_generation. If a document for newer generations has
+        already been stored, that one is kept instead, since it may have been
+        built concurrently by a later change.
+
+        Returns the document that ends up stored.
+        """
+        # This is read outside the transaction, since it may need to load the
+        # package's latest version from another entity group.
+        updated = package.updated
+
+        def txn():
+            existing = cls.get_for(package, kind)
+            if existing and _generations(existing) >= _generations(package):
+                return existing
+            document = cls(key_name=kind, parent=package,
+                           generation=package.generation or 0,
+                           downloads_generation=package.downloads_generation or 0,
+                           updated=updated,
+                           json=json,
+                           gzipped_json=gzip(json))
+            document.put()
+            return document
+
+        if db.is_in_transaction(): return txn()
+        return db.run_in_transaction(txn)
+
+def _generations(entity):
+    """Return the generations of a Package or PackageDocument, for ordering."""
+    return (entity.generation or 0, entity.downloads_generation or 0)
+
+def gzip(data):
+    """Compress a string in the gzip format."""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+def gunzip(data):
+    """Decompress a string in the gzip format."""
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
@@ -0,0 +1,236 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+import uuid
+
+import dateutil.tz
+from feedgen.entry import FeedEntry as AtomEntry
+from feedgen.feed import FeedGenerator
+from google.appengine.api import memcache
+from google.appengine.ext import db
+from lxml import etree
+
+# How long (in seconds) the feed's generation is kept in memcache. A reader
+# that races with an upload can cache an outdated generation, so this bounds
+# how long it can be served.
+_CACHE_TIME = 60
+
+# The root URL of the site, used for the absolute links in the feed.
+_SITE_URL = 'https://pub.dartlang.org/'
+
+class FeedEntry(db.Model):
+    """The Atom entry for a package in the feed of recently updated packages.
+
+    Each entry is a child of the PackageFeed, and its key name is the name of
+    the package it describes.
+    """
+
+    updated = db.DateTimeProperty(required=True)
+    """When the package's latest version was uploaded."""
+
+    xml = db.BlobProperty(required=True)
+    """The serialized <entry> element."""
+
+class PackageFeed(db.Model):
+    """The first pages of the Atom feed of recently updated packages.
+
+    Building a feed entry renders the package's README, so rather than building
+    the feed whenever it's requested, the entries for the most recently updated
+    packages are stored as finished XML. Each upload replaces its package's
+    entry and drops the oldest entry (see update()), so the feed never has to
+    be rebuilt from scratch. There's a single feed, whose key name is "atom".
+    """
+
+    PER_PAGE = 10
+    """The number of packages on each page of the feed."""
+
+    PAGES = 5
+    """The number of pages of the feed that are stored.
+
+    Later pages are rarely requested, so they're built on demand."""
+
+    generation = db.IntegerProperty(required=True, default=0, indexed=False)
+    """A counter that's incremented each time the stored entries change."""
+
+    updated = db.DateTimeProperty(indexed=False)
+    """When the most recently updated package in the feed was updated."""
+
+    @classmethod
+    def get_validators(cls):
+        """Return the generation and update time of the stored feed.
+
+        These are cached in memcache, so they can be used to answer a
+        conditional request without touching the datastore. If the feed hasn't
+        been stored yet, this builds it.
+
+        Returns: A dict with the feed's 'generation' and 'updated' time.
+        """
+        validators = memcache.get(cls._validators_cache_key())
+        if validators is not None: return validators
+
+        feed = cls.get_by_key_name('atom') or cls.rebuild()
+        validators = {'generation': feed.generation, 'updated': feed.updated}
+        memcache.set(cls._validators_cache_key(), validators, time=_CACHE_TIME)
+        return validators
+
+    @classmethod
+    def get_page(cls, page, generation):
+        """Return the XML for a stored page of the feed.
+
+        The finished page is cached in memcache for the given generation.
+
+        Arguments:
+          page: The page of the feed to get. One-based, and no greater than
+            PAGES.
+          generation: The generation returned by get_validators().
+        """
+        cache_key = cls._page_cache_key(page, generation)
+        xml = memcache.get(cache_key)
+        if xml is not None: return xml
+
+        entries = FeedEntry.all() \
+            .ancestor(db.Key.from_path(cls.kind(), 'atom')) \
+            .order('-updated') \
+            .fetch(cls.PER_PAGE, offset=(page - 1) * cls.PER_PAGE)
+        xml = feed_xml([entry.xml for entry in entries],
+                       entries[0].updated if entries else None)
+        memcache.set(cache_key, xml)
+        return xml
+
+    @classmethod
+    def rebuild(cls):
+        """Build and store the feed from the most recently updated packages.
+
+        Returns: The stored PackageFeed.
+        """
+        from package import Package
+        packages = Package.prefetch_latest_versions(
+            Package.all().order('-updated').fetch(cls.PER_PAGE * cls.PAGES))
+
+        feed = cls(key_name='atom')
+        entries = [FeedEntry(parent=feed, key_name=package.name,
+                             updated=package.updated, xml=entry_xml(package))
+                   for package in packages if package.latest_version]
+        if entries: feed.updated = entries[0].updated
+
+        # The feed is stored last, so that a concurrent reader won't find it
+        # before its entries.
+        db.put(entries)
+        feed.put()
+        memcache.delete(cls._validators_cache_key())
+        return feed
+
+    @classmethod
+    def update(cls, name, refresh=False):
+        """Bring a package's entry in the feed up to date.
+
+        This replaces the package's entry with one for its latest version,
+        dropping the oldest entry to make room if the package wasn't already
+        in the feed. It's run by a task enqueued in the same transaction as
+        each change to a package's latest version, so the feed's single entity
+        group isn't written to during uploads.
+
+        Arguments:
+          name: The name of the package.
+          refresh: Whether the latest version was replaced without changing
+            when it was uploaded, as a reload does. The package's entry is
+            rebuilt even though its update time matches, but it's only
+            rebuilt if it's already in the feed.
+        """
+        from package import Package
+        package = Package.get_by_key_name(name)
+        if package is None or package.latest_version is None: return
+        updated = package.updated
+        xml = entry_xml(package)
+
+        def txn():
+            feed = cls.get_by_key_name('atom')
+            # The feed will be built from scratch when it's next requested.
+            if feed is None: return False
+
+            existing = FeedEntry.get_by_key_name(name, parent=feed)
+            if refresh:
+                if existing is None: return False
+            elif existing is not None and existing.updated == updated:
+                return False
+
+            keep = cls.PER_PAGE * cls.PAGES
+            if existing is None: keep -= 1
+            stale = [key for key in FeedEntry.all(keys_only=True)
+                         .ancestor(feed).order('-updated')
+                         .fetch(None, offset=keep)
+                     if key.name() != name]
+
+            db.delete(stale)
+            FeedEntry(parent=feed, key_name=name, updated=updated,
+                      xml=xml).put()
+            feed.generation += 1
+            feed.updated = max(feed.updated or updated, updated)
+            feed.put()
+            return True
+
+        if db.run_in_transaction(txn):
+            memcache.delete(cls._validators_cache_key())
+
+    @classmethod
+    def _validators_cache_key(cls):
+        """The memcache key for the feed's generation and update time."""
+        return 'package_feed_validators'
+
+    @classmethod
+    def _page_cache_key(cls, page, generation):
+        """The memcache key for a page of the feed in a generation."""
+        return 'package_feed_page_%d_%d' % (generation, page)
+
+def entry_xml(package):
+    """Return the serialized Atom entry for a package's latest version.
+
+    The entry's content is the README, whose rendered HTML is stored by
+    Readme.render, so building an entry doesn't usually render Markdown.
+    """
+    version = package.latest_version
+    url = _SITE_URL + 'packages/' + package.name
+
+    entry = AtomEntry()
+    for author in version.pubspec.authors:
+        entry.author({"name": author[0]})
+    entry.title("v" + version.pubspec.get("version") + " of " + package.name)
+    entry.link(link={"href": url, "rel": "alternate", "title": package.name})
+    entry.id(uuid.uuid5(uuid.NAMESPACE_URL, (
+        url + "#" + version.pubspec.get("version")).encode('utf-8')).urn)
+    entry.updated(_utc(package.updated))
+    entry.description(version.pubspec.get("description", "Not Available"))
+    readme = version.readme_obj
+    if readme is not None:
+        entry.content(readme.render(), type='html')
+    else:
+        entry.content("<p>No README Found</p>", type='html')
+    return etree.tostring(entry.atom_entry(), pretty_print=True)
+
+def feed_xml(entries, updated):
+    """Return a complete Atom feed document.
+
+    Arguments:
+      entries: The serialized <entry> elements, as returned by entry_xml.
+      updated: When the feed was last updated, as a naive datetime in UTC, or
+        None to use the current time.
+    """
+    feed = FeedGenerator()
+    feed.id(_SITE_URL + "feed.atom")
+    feed.title("Pub Packages for Dart")
+    feed.link(href=_SITE_URL, rel="alternate")
+    feed.link(href=_SITE_URL + "feed.atom", rel="self")
+    feed.description("Last Updated Packages")
+    feed.author({"name": "Dart Team"})
+    if updated is not None: feed.updated(_utc(updated))
+
+    # The feed is serialized without entries, and the stored entries are
+    # spliced in before its closing tag.
+    head, tail = feed.atom_str(pretty=True).rsplit('</feed>', 1)
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + head + \
+        ''.join(str(entry) for entry in entries) + '</feed>' + tail
+
+def _utc(time):
+    """Attach the UTC time zone to a naive datetime."""
+    return time.replace(tzinfo=dateutil.tz.tzutc())
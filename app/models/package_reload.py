@@ -0,0 +1,157 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+import datetime
+
+from google.appengine.ext import db
+
+# How long a shard can go without recording a checkpoint before it's assumed
+# that no task is working on it. This is longer than a task can run.
+_STALE_TIME = datetime.timedelta(minutes=15)
+
+class PackageReload(db.Model):
+    """A reload of every package version from its archive.
+
+    The work is split into ReloadShards, each of which covers a contiguous
+    range of packages and is stored as a child of this entity. Shards record
+    their progress as they go, so a reload's status survives memcache
+    evictions and an interrupted shard can pick up where it left off.
+    """
+
+    created = db.DateTimeProperty(auto_now_add=True)
+    """When this reload was started."""
+
+    total = db.IntegerProperty(required=True, default=0, indexed=False)
+    """The number of package versions to reload."""
+
+    @classmethod
+    def current(cls):
+        """Return the most recently started reload, or None."""
+        return cls.all().order('-created').get()
+
+    @classmethod
+    def start(cls, version_keys, shard_count):
+        """Start a new reload and divide it into shards.
+
+        Shard boundaries always fall between packages, and each shard gets
+        about the same number of versions. Fewer than shard_count shards are
+        created if there aren't enough packages to go around.
+
+        Arguments:
+          version_keys: The keys of all package versions to reload, ordered by
+            key so that the versions of each package are adjacent.
+          shard_count: The maximum number of shards to create.
+
+        Returns: The new PackageReload. Its shards are already stored.
+        """
+        packages = []
+        for key in version_keys:
+            name = key.parent().name()
+            if packages and packages[-1][0] == name:
+                packages[-1][1] += 1
+            else:
+                packages.append([name, 1])
+
+        total = sum(count for _, count in packages)
+        reload = cls(total=total)
+        reload.put()
+
+        per_shard = max(1, -(-total // shard_count))
+        shards = []
+        for name, count in packages:
+            if not shards or (shards[-1].total >= per_shard and
+                              len(shards) < shard_count):
+                if shards: shards[-1].end = name
+                shards.append(ReloadShard(parent=reload, start=name))
+            shards[-1].total += count
+
+        db.put(shards)
+        return reload
+
+    @property
+    def shards(self):
+        """The shards of this reload."""
+        return ReloadShard.all().ancestor(self).fetch(None)
+
+    def get_status(self):
+        """Return the status of this reload.
+
+        This is a map with keys 'total' and 'count', indicating the total number
+        of package versions to reload and the number that have been reloaded so
+        far, respectively. If every shard is done, this returns None instead.
+        """
+        shards = self.shards
+        if all(shard.done for shard in shards): return
+        return {'total': self.total,
+                'count': sum(shard.count for shard in shards)}
+
+class ReloadShard(db.Model):
+    """A range of packages to reload as part of a PackageReload.
+
+    The versions in a shard are reloaded in order of key, a batch at a time.
+    After each batch the shard records the last version it finished, so work
+    that's retried or resumed starts from there.
+    """
+
+    start = db.StringProperty(required=True, indexed=False)
+    """The name of the first package in this shard."""
+
+    end = db.StringProperty(indexed=False)
+    """The name of the first package after this shard.
+
+    This is None for the last shard of a reload."""
+
+    last = db.StringProperty(indexed=False)
+    """The encoded key of the last package version this shard has reloaded.
+
+    This is None if the shard hasn't reloaded any versions yet."""
+
+    total = db.IntegerProperty(required=True, default=0, indexed=False)
+    """The number of package versions in this shard."""
+
+    count = db.IntegerProperty(required=True, default=0, indexed=False)
+    """The number of package versions this shard has reloaded."""
+
+    done = db.BooleanProperty(required=True, default=False, indexed=False)
+    """Whether every package in this shard has been reloaded."""
+
+    updated = db.DateTimeProperty(auto_now=True)
+    """When this shard last recorded a checkpoint."""
+
+    @property
+    def running(self):
+        """Whether a task is likely to be working on this shard."""
+        return not self.done and \
+            datetime.datetime.now() - self.updated < _STALE_TIME
+
+    def package_key(self, name):
+        """Return the key for a package in the same namespace as this shard."""
+        return db.Key.from_path('Package', name,
+                                namespace=self.key().namespace())
+
+    def checkpoint(self, last, new_last, count, done):
+        """Record that a batch of package versions has been reloaded.
+
+        This only succeeds if the shard's checkpoint is still last, so that a
+        batch that's processed twice (for example, by a task that's retried
+        after its work was already recorded) isn't counted twice.
+
+        Arguments:
+          last: The shard's checkpoint when the batch was started.
+          new_last: The encoded key of the last package version in the batch.
+          count: The number of package versions in the batch.
+          done: Whether this was the shard's final batch.
+
+        Returns: Whether the checkpoint was recorded.
+        """
+        def txn():
+            shard = ReloadShard.get(self.key())
+            if shard.done or shard.last != last: return False
+            shard.last = new_last
+            shard.count += count
+            shard.done = done
+            shard.put()
+            return True
+
+        return db.run_in_transaction(txn)
@@ -5,8 +5,8 @@
 import copy
 import json
 import tarfile
+import zlib
 
-from google.appengine.api import memcache
 from google.appengine.ext import db
 import yaml
 
@@ -14,10 +14,16 @@ import models
 from semantic_version import SemanticVersion
 from handlers import cloud_storage
 from package import Package
+from package_reload import PackageReload
 from properties import PubspecProperty, ReadmeProperty, VersionProperty
 from pubspec import Pubspec
 from readme import Readme
 
+# The distance between the sort orders of adjacent versions when a package's
+# versions are numbered. This leaves room to insert versions between existing
+# ones without renumbering.
+_SORT_ORDER_GAP = 2**20
+
 class PackageVersion(db.Model):
     """The model for a single version of a package.
 
@@ -65,7 +71,9 @@ class PackageVersion(db.Model):
     sort_order = db.IntegerProperty(default=-1)
     """The sort order for this version.
 
-    Lower numbers indicate earlier versions."""
+    Lower numbers indicate earlier versions. Sort orders are spaced
+    _SORT_ORDER_GAP apart when they're assigned, so they're generally not
+    consecutive. See assign_sort_order."""
 
     uploaderEmail = db.StringProperty(required=True)
     """The user email who uploaded this package version."""
@@ -84,6 +92,15 @@ class PackageVersion(db.Model):
       else:
         return None
 
+    def prerender(self):
+        """Render this version's README and CHANGELOG ahead of time.
+
+        Rendered HTML is stored, so this saves the first visitor to the
+        package's page from waiting for it.
+        """
+        for readme in [self.readme_obj, self.changelog_obj]:
+            if readme: readme.render()
+
     @classmethod
     def new(cls, **kwargs):
         """Construct a new package version.
@@ -130,6 +147,10 @@ class PackageVersion(db.Model):
         loaded and assigned as the package version's package. If it doesn't, a
         new package will be created.
 
+        The archive is read in a single pass as a stream, keeping only the
+        files that are needed in memory, so file doesn't need to support
+        seeking and the archive is never held in memory as a whole.
+
         Arguments:
           file: An open file object containing a .tar.gz archive.
           uploaderEmail: The user email who uploaded this package archive.
@@ -137,29 +158,77 @@ class PackageVersion(db.Model):
         Returns: Both the Package object and the PackageVersion object.
         """
         try:
-            tar = tarfile.open(mode="r:gz", fileobj=file)
-            changelog = Readme.from_archive(tar, name='CHANGELOG')
-            readme = Readme.from_archive(tar)
-            pubspec = Pubspec.from_archive(tar)
+            files = {}
+            libraries = []
+            tar = tarfile.open(mode="r|gz", fileobj=file)
+            for member in tar:
+                name = member.name
+                if name.startswith('lib/'):
+                    if not name.startswith('lib/src/') and \
+                            name.endswith('.dart'):
+                        libraries.append(name[4:])
+                elif member.isfile() and (name == 'pubspec.yaml' or
+                        Readme.is_candidate(name, 'README') or
+                        Readme.is_candidate(name, 'CHANGELOG')):
+                    files[name] = tar.extractfile(member).read()
+
+            changelog = Readme.from_files(files, name='CHANGELOG')
+            readme = Readme.from_files(files)
+            pubspec = Pubspec.parse(files['pubspec.yaml'])
             name = pubspec.required('name')
             package = Package.get_by_key_name(name)
             if not package:
                 assert uploaderEmail is not None
                 package = Package.new(name=name, uploaderEmails=[uploaderEmail])
 
-            libraries = sorted(name[4:] for name in tar.getnames()
-                               if name.startswith('lib/') and
-                                   not name.startswith('lib/src/') and
-                                   name.endswith('.dart'))
-
             return PackageVersion.new(
                 package=package, changelog=changelog, readme=readme,
-                pubspec=pubspec, libraries=libraries,
+                pubspec=pubspec, libraries=sorted(libraries),
                 uploaderEmail=uploaderEmail)
-        except (tarfile.TarError, KeyError) as err:
+        except (tarfile.TarError, zlib.error, KeyError) as err:
             raise db.BadValueError(
                 "Error parsing package archive: %s" % err)
 
+    def assign_sort_order(self):
+        """Set the sort order for this version relative to its package's others.
+
+        This must be called before this version is first saved, within the
+        transaction that saves it. Usually only this version's sort order needs
+        to be set, but if there's no room between the sort orders of its
+        neighbors, all of the package's versions are renumbered.
+
+        Returns: The list of package versions that need to be saved, including
+          this one.
+        """
+        if not self.package.is_saved():
+            self.sort_order = _SORT_ORDER_GAP
+            return [self]
+
+        query = PackageVersion.all().ancestor(self.package).order('-sort_order')
+        last = query.get()
+        if last is None:
+            self.sort_order = _SORT_ORDER_GAP
+            return [self]
+        elif last.version < self.version:
+            # Most uploads are the new latest version, which needs no more than
+            # the package's current last version to be placed.
+            self.sort_order = last.sort_order + _SORT_ORDER_GAP
+            return [self]
+
+        versions = sorted(query.run(), key=lambda version: version.version)
+        index = len([version for version in versions
+                     if version.version < self.version])
+        lower = versions[index - 1].sort_order if index > 0 else 0
+        upper = versions[index].sort_order
+        if upper - lower > 1:
+            self.sort_order = (lower + upper) / 2
+            return [self]
+
+        versions.insert(index, self)
+        for i, version in enumerate(versions):
+            version.sort_order = (i + 1) * _SORT_ORDER_GAP
+        return versions
+
     @classmethod
     def get_by_name_and_version(cls, package_name, version):
         """Looks up a package version by its package name and version."""
@@ -172,18 +241,15 @@ class PackageVersion(db.Model):
         """Returns the status of the current package reload.
 
         This is a map with keys 'total' and 'count', indicating the total number
-        of packages to reload and the number that have been reloaded so far,
-        respectively.
+        of package versions to reload and the number that have been reloaded so
+        far, respectively.
 
         If the reload has already completed, or no reload has been started, this
         will return None.
         """
-        versions_reloaded = memcache.get('versions_reloaded')
-        versions_to_reload = memcache.get('versions_to_reload')
-        if versions_to_reload is None: return
-        if versions_reloaded is None: return
-        if versions_to_reload == versions_reloaded: return
-        return {'total': versions_to_reload, 'count': versions_reloaded}
+        reload = PackageReload.current()
+        if reload is None: return
+        return reload.get_status()
 
     @property
     def short_created(self):
@@ -11,6 +11,19 @@ from Crypto.Signature import PKCS1_v1_5
 from google.appengine.ext import db
 
 import handlers
+from lru_cache import LRUCache
+
+# How long (in seconds) an instance uses a private key it's loaded before it
+# checks for a new one. Keys are rarely changed, and changing them only clears
+# the cache on the instance that handles the change, so other instances may use
+# the old key for up to this long.
+_CACHE_TIME = 10 * 60
+
+# Private key values, keyed by their encoded datastore keys.
+_values = LRUCache(4, ttl=_CACHE_TIME)
+
+# Signers for the OAuth2 private key, keyed by the key's PEM.
+_signers = LRUCache(2, ttl=_CACHE_TIME)
 
 class PrivateKey(db.Model):
     """A model that stores the Google API private keys for this app.
@@ -32,6 +45,47 @@ class PrivateKey(db.Model):
     the key string.
     """
 
+    def put(self, *args, **kwargs):
+        """Saves this key and clears it from this instance's cache.
+
+        The cache is cleared after the write, so that a concurrent request on
+        this instance can't cache the old value again in between. Other
+        instances keep using the old value until their caches expire, which
+        takes up to _CACHE_TIME.
+        """
+        result = super(PrivateKey, self).put(*args, **kwargs)
+        self._clear_cache()
+        return result
+
+    def delete(self, *args, **kwargs):
+        """Deletes this key and clears it from this instance's cache.
+
+        Like put(), other instances keep using the deleted value until their
+        caches expire.
+        """
+        result = super(PrivateKey, self).delete(*args, **kwargs)
+        self._clear_cache()
+        return result
+
+    def _clear_cache(self):
+        """Clears this key from this instance's caches."""
+        _values.delete(str(self.key()))
+        # Signers are keyed by the key's value, so one for the old value would
+        # never be used again.
+        _signers.clear()
+
+    @classmethod
+    def _get_value(cls, key_name):
+        """Gets the value of a private key, caching it on this instance."""
+        cache_key = str(db.Key.from_path(cls.kind(), key_name))
+        value = _values.get(cache_key)
+        if value is not None: return value
+
+        instance = cls.get_by_key_name(key_name)
+        if instance is None: return None
+        _values.set(cache_key, instance.value)
+        return instance.value
+
     @classmethod
     def set_oauth(cls, value):
         """Sets the value of the OAuth2 private key."""
@@ -42,8 +96,7 @@ class PrivateKey(db.Model):
     @classmethod
     def get_oauth(cls):
         """Gets the value of the OAuth2 private key."""
-        instance = cls.get_by_key_name('singleton')
-        return instance and instance.value
+        return cls._get_value('singleton')
 
     @classmethod
     def set_api(cls, value):
@@ -53,8 +106,7 @@ class PrivateKey(db.Model):
     @classmethod
     def get_api(cls):
         """Gets the value of the API private key."""
-        instance = cls.get_by_key_name('api')
-        return instance and instance.value
+        return cls._get_value('api')
 
     @classmethod
     def sign(cls, string):
@@ -78,8 +130,15 @@ class PrivateKey(db.Model):
             # dumb hash of the private key and the string.
             #
             # See http://code.google.com/p/googleappengine/issues/detail?id=8188
-            key = RSA.importKey(value, passphrase='notasecret')
-            return base64.b64encode(PKCS1_v1_5.new(key).sign(SHA256.new(string)))
+            #
+            # Decrypting and importing the key is much slower than signing, so
+            # the signer is cached for as long as the key is.
+            signer = _signers.get(value)
+            if signer is None:
+                key = RSA.importKey(value, passphrase='notasecret')
+                signer = PKCS1_v1_5.new(key)
+                _signers.set(value, signer)
+            return base64.b64encode(signer.sign(SHA256.new(string)))
         else:
             m = hashlib.md5()
             m.update(value)
@@ -28,14 +28,48 @@ class DocumentProperty(db.Property):
         return json.loads(value)
 
 class PubspecProperty(DocumentProperty):
-    """A property that stores a parsed Pubspec."""
+    """A property that stores a parsed Pubspec.
+
+    Loading a model doesn't decode its pubspec. The JSON is only decoded when
+    the property is first read, so models whose pubspecs aren't used (for
+    example, in listings) don't pay for it. A model that's saved again without
+    its pubspec having been read writes the original JSON back as-is.
+    """
 
     data_type = Pubspec
 
+    def __get__(self, model_instance, model_class):
+        value = super(PubspecProperty, self).__get__(model_instance, model_class)
+        if not isinstance(value, _EncodedPubspec): return value
+
+        # Pubspecs are validated before they're stored, so there's no need to
+        # validate them again.
+        value = Pubspec.from_trusted(json.loads(value.json))
+        setattr(model_instance, self._attr_name(), value)
+        return value
+
+    def validate(self, value):
+        if isinstance(value, _EncodedPubspec): return value
+        return super(PubspecProperty, self).validate(value)
+
+    def get_value_for_datastore(self, model_instance):
+        """Dump the pubspec to JSON, unless it was never decoded."""
+        value = getattr(model_instance, self._attr_name(), None)
+        if isinstance(value, _EncodedPubspec): return value.json
+        return super(PubspecProperty, self) \
+            .get_value_for_datastore(model_instance)
+
     def make_value_from_datastore(self, value):
-        """Load the pubspec from JSON."""
-        contents = super(PubspecProperty, self).make_value_from_datastore(value)
-        return Pubspec(contents)
+        """Wrap the pubspec's JSON to be decoded when it's first read."""
+        if value is None:
+            return None
+        return _EncodedPubspec(value)
+
+class _EncodedPubspec(object):
+    """The JSON of a pubspec that hasn't been decoded yet."""
+
+    def __init__(self, json):
+        self.json = json
 
 class PickledProperty(db.Property):
     """A property that stores a picklable object."""
@@ -7,6 +7,11 @@ import re
 from google.appengine.ext import db
 import yaml
 
+# Pubspecs are parsed with libyaml when it's available, since it's much faster
+# than the pure-Python parser. Either way, only standard YAML types are
+# constructed.
+_Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 class Pubspec(dict):
     """A parsed pubspec.yaml file."""
 
@@ -46,6 +51,17 @@ class Pubspec(dict):
                 'Pubspec field "documentation" can only use "http" or ' +
                 '"https" schemes.')
 
+    @classmethod
+    def from_trusted(cls, contents):
+        """Construct a pubspec from contents that are known to be valid.
+
+        This skips validation, so it should only be used for pubspecs that were
+        validated before they were stored.
+        """
+        pubspec = cls.__new__(cls)
+        dict.__init__(pubspec, contents)
+        return pubspec
+
     @classmethod
     def from_archive(cls, tar):
         """Extract and return the parsed pubspec from a package archive.
@@ -53,8 +69,17 @@ class Pubspec(dict):
         Arguments:
           tar: A TarFile object.
         """
+        return cls.parse(tar.extractfile("pubspec.yaml").read())
+
+    @classmethod
+    def parse(cls, text):
+        """Parse and return a pubspec from the contents of pubspec.yaml.
+
+        Arguments:
+          text: The YAML source of the pubspec.
+        """
         try:
-            pubspec = yaml.load(tar.extractfile("pubspec.yaml").read())
+            pubspec = yaml.load(text, Loader=_Loader)
             if not isinstance(pubspec, dict):
                 raise db.BadValueError(
                     "Invalid pubspec, expected mapping at top level, was %s" %
@@ -3,11 +3,25 @@
 # BSD-style license that can be found in the LICENSE file.
 
 import cgi
+import hashlib
 import os
 import re
 
 import markdown
 
+from lru_cache import LRUCache
+from rendered_readme import RenderedReadme
+
+_RENDER_VERSION = 1
+"""The version of the README rendering pipeline.
+
+This should be incremented whenever READMEs would render differently, such as
+when Markdown or its extensions are upgraded, so that stored HTML from the old
+pipeline is no longer used."""
+
+_rendered = LRUCache(100)
+"""Recently rendered HTML, keyed by Readme.content_hash."""
+
 class Readme(object):
     """A README file with associated format information."""
 
@@ -29,19 +43,58 @@ class Readme(object):
           tar: A TarFile object.
           name: Case-insensitive name for the README file; defaults to `README`.
         """
+        filename = cls._choose_filename(tar.getnames(), name)
+        if filename is None: return None
+        return cls._decode(tar.extractfile(filename).read(), filename)
+
+    @classmethod
+    def from_files(cls, files, name="README"):
+        """Return the README from files that have been read from an archive.
+
+        This is like from_archive, but works with archives that are being read
+        as a stream and so can't be searched.
+
+        Return None if no README could be found.
+
+        Arguments:
+          files: A map from file names to their contents. This should include
+            at least every file for which Readme.is_candidate is true.
+          name: Case-insensitive name for the README file; defaults to `README`.
+        """
+        filename = cls._choose_filename(files.iterkeys(), name)
+        if filename is None: return None
+        return cls._decode(files[filename], filename)
+
+    @staticmethod
+    def is_candidate(filename, name="README"):
+        """Whether filename in a package archive could be the README.
+
+        Arguments:
+          filename: The path of the file within the archive.
+          name: Case-insensitive name for the README file; defaults to `README`.
+        """
+        return os.path.dirname(filename) == '' and bool(
+            re.match('^{0}($|\.)'.format(name), filename, re.IGNORECASE))
+
+    @classmethod
+    def _choose_filename(cls, filenames, name):
+        """Choose the README from the names of files in an archive.
+
+        Return None if none of the files is a README.
+        """
 
         # If there are multiple READMEs, choose the one with the fewest
         # extensions. This handles the case where there are multiple READMEs in
         # different languages named e.g. "README.md" vs "README.jp.md".
-        readmes = [n for n in tar.getnames()
-                   if os.path.dirname(n) == ''
-                   and re.match('^{0}($|\.)'.format(name), n, re.IGNORECASE)]
+        readmes = [n for n in filenames if cls.is_candidate(n, name)]
         if len(readmes) == 0: return None
+        return min(readmes, key=lambda(n): (n.count('.'), n))
 
-        filename = min(readmes, key=lambda(n): (n.count('.'), n))
-        text = unicode(tar.extractfile(filename).read(),
-                       encoding='utf-8', errors='replace')
-        return Readme(text, filename)
+    @classmethod
+    def _decode(cls, contents, filename):
+        """Create a Readme from the raw contents of a file."""
+        text = unicode(contents, encoding='utf-8', errors='replace')
+        return cls(text, filename)
 
     @property
     def format(self):
@@ -52,12 +105,38 @@ class Readme(object):
             ".mdown":    Readme.Format.MARKDOWN,
         }.get(os.path.splitext(self.filename)[1].lower(), Readme.Format.TEXT)
 
+    @property
+    def content_hash(self):
+        """A hash identifying the HTML that this README renders to."""
+        text = self.text
+        if isinstance(text, unicode): text = text.encode('utf-8')
+
+        sha = hashlib.sha1()
+        sha.update('%d:%d:' % (_RENDER_VERSION, self.format))
+        sha.update(text)
+        return sha.hexdigest()
+
     def render(self):
-        """Renders the README to HTML."""
-        return {
-            Readme.Format.MARKDOWN: _render_markdown,
-            Readme.Format.TEXT:     _render_text,
-        }[self.format](self.text)
+        """Renders the README to HTML.
+
+        Each distinct README is only rendered once. The HTML is stored under
+        the README's content hash, and recently used HTML is also kept in
+        memory.
+        """
+        key = self.content_hash
+        html = _rendered.get(key)
+        if html is not None: return html
+
+        html = RenderedReadme.get_html(key)
+        if html is None:
+            html = {
+                Readme.Format.MARKDOWN: _render_markdown,
+                Readme.Format.TEXT:     _render_text,
+            }[self.format](self.text)
+            RenderedReadme.store(key, html)
+
+        _rendered.set(key, html)
+        return html
 
 def _render_markdown(text):
     return markdown.markdown(
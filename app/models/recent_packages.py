@@ -0,0 +1,148 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+import json
+import logging
+
+from google.appengine.api import memcache
+from google.appengine.ext import db
+
+# How long (in seconds) the list is kept in memcache. A reader that races with
+# an update can cache an outdated list, so this bounds how long it can be
+# served.
+_CACHE_TIME = 60
+
+# The largest encoded list that's stored, in bytes. This leaves room below the
+# datastore's and memcache's 1MB limits. Entries only hold rendered fields, so a
+# list this large would take packages with extraordinarily long author lists.
+_MAX_SIZE = 900 * 1024
+
+class RecentPackages(db.Model):
+    """The most recently updated packages, ready to be listed.
+
+    The front page and the first page of each package listing show the same
+    packages in the same order, so rather than querying for them on each
+    request, a single list is stored here with everything those pages display
+    about each package. It's kept up to date by update(), which is run by a
+    task enqueued in the same transaction as each change to a package's latest
+    version. There's a single list, whose key name is "recent".
+
+    The list is initialized lazily by get_packages(). If it would be too large
+    to store, the packages are queried for instead.
+    """
+
+    SIZE = 100
+    """The number of packages in the list.
+
+    This is the size of the first page of the largest listing, /api/packages."""
+
+    packages = db.BlobProperty()
+    """The JSON-encoded list of packages, most recently updated first.
+
+    Each package is a dict built by _entry(). This is None if the list was
+    larger than _MAX_SIZE."""
+
+    @classmethod
+    def get_packages(cls, count):
+        """Return the count most recently updated packages.
+
+        Each package is a dict with the fields listings display, so it can be
+        used in place of a Package in a template.
+        """
+        cached = memcache.get(cls._cache_key())
+        if cached is None:
+            recent = cls.get_by_key_name('recent') or cls.rebuild()
+            cached = {'packages': recent.packages and
+                                  json.loads(recent.packages)}
+            memcache.set(cls._cache_key(), cached, time=_CACHE_TIME)
+
+        if cached['packages'] is None: return cls._query(count)
+        return cached['packages'][:count]
+
+    @classmethod
+    def rebuild(cls):
+        """Build and store the list from scratch.
+
+        Returns: The stored RecentPackages.
+        """
+        recent = cls(key_name='recent',
+                     packages=cls._encode(cls._query(cls.SIZE)))
+        recent.put()
+        memcache.delete(cls._cache_key())
+        return recent
+
+    @classmethod
+    def update(cls, name):
+        """Bring a package's place in the list up to date.
+
+        This reads the package as it is when it runs, so running it more than
+        once for the same change, or out of order with other changes, is
+        harmless.
+        """
+        from package import Package
+        package = Package.get_by_key_name(name)
+        entry = None
+        if package is not None and package.latest_version is not None:
+            entry = cls._entry(package)
+
+        def txn():
+            recent = cls.get_by_key_name('recent')
+            # The list will be built from scratch when it's next requested.
+            if recent is None: return
+
+            # A list that was too large to store can't be updated in place, so
+            # it's built from scratch in case this change makes it fit.
+            if recent.packages is None:
+                recent.delete()
+                return
+
+            packages = [other for other in json.loads(recent.packages)
+                        if other['name'] != name]
+            if entry is not None:
+                packages.append(entry)
+                packages.sort(key=lambda other: other['updated'], reverse=True)
+            recent.packages = cls._encode(packages[:cls.SIZE])
+            recent.put()
+
+        db.run_in_transaction(txn)
+        memcache.delete(cls._cache_key())
+
+    @classmethod
+    def _query(cls, count):
+        """Query for the entries of the count most recently updated packages."""
+        from package import Package
+        packages = Package.prefetch_latest_versions(
+            Package.all().order('-updated').fetch(count))
+        return [cls._entry(package) for package in packages
+                if package.latest_version]
+
+    @classmethod
+    def _encode(cls, packages):
+        """Encode a list of entries, or return None if it's too large."""
+        encoded = json.dumps(packages)
+        if len(encoded) <= _MAX_SIZE: return encoded
+        logging.warning('The list of recent packages is %d bytes, which is '
+                        'too large to store' % len(encoded))
+        return None
+
+    @classmethod
+    def _entry(cls, package):
+        """Return the list entry for a package with a latest version.
+
+        This only holds the fields listings display, already rendered, so
+        that entries stay small.
+        """
+        return {
+            'name': package.name,
+            'version': str(package.latest_version.version),
+            'updated': package.updated.isoformat(),
+            'short_updated': package.short_updated,
+            'ellipsized_description': package.ellipsized_description,
+            'authors_html': package.authors_html
+        }
+
+    @classmethod
+    def _cache_key(cls):
+        """The memcache key for the list."""
+        return 'recent_package_list'
@@ -0,0 +1,37 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+from google.appengine.ext import db
+
+class RenderedReadme(db.Model):
+    """The HTML rendering of a README or CHANGELOG file.
+
+    Rendering Markdown is expensive, and a given file always renders to the
+    same HTML, so each rendering is stored under a hash of the file's contents.
+    The hash is the key name. See Readme.render.
+    """
+
+    html = db.TextProperty(required=True)
+    """The rendered HTML."""
+
+    _MAX_SIZE = 900 * 2**10 # 900KB
+    """The size of the largest rendering that will be stored, in bytes.
+
+    This leaves room under the datastore's 1MB entity limit."""
+
+    @classmethod
+    def get_html(cls, content_hash):
+        """Return the stored HTML for content_hash, or None."""
+        rendered = cls.get_by_key_name(content_hash)
+        return rendered and rendered.html
+
+    @classmethod
+    def store(cls, content_hash, html):
+        """Store the HTML rendered for content_hash.
+
+        Renderings that are too large to store are silently dropped; they'll
+        just be rendered again next time.
+        """
+        if len(html.encode('utf-8')) > cls._MAX_SIZE: return
+        cls(key_name=content_hash, html=html).put()
@@ -0,0 +1,308 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""An inverted index for searching packages.
+
+Each package is indexed by the terms in its name, its libraries' paths, and its
+latest version's description and README. Each term has a score for each package
+it appears in, which is higher the more significant the term is to the package.
+
+The index maps each term to the packages it appears in, along with their scores.
+Each term's postings are stored in their own SearchTerm, so indexing two
+packages only contends if they share a term, and a query only loads the terms
+it asks for. Terms are cached in instance memory for a short time, so most
+queries don't touch the datastore at all.
+
+The index is built as packages are uploaded. reindex() rebuilds it for every
+package, and should be run after the index is first deployed or its scoring
+changes.
+"""
+
+from collections import defaultdict
+import json
+import logging
+import re
+import zlib
+
+from google.appengine.ext import db
+from google.appengine.ext import deferred
+
+from lru_cache import LRUCache
+from package import Package
+
+# The number of terms an instance keeps in its cache.
+_TERM_CACHE_SIZE = 1000
+
+# How long (in seconds) an instance uses a term it's loaded before it checks
+# for changes.
+_TERM_CACHE_TIME = 60
+
+# The maximum number of packages indexed under each term. The packages with the
+# highest scores are kept, which bounds the size of each SearchTerm well below
+# the datastore's entity size limit.
+_MAX_POSTINGS = 5000
+
+# The maximum number of distinct README terms indexed for each package. The
+# most frequent terms are kept.
+_MAX_README_TERMS = 200
+
+# The number of packages reindex() indexes in each task.
+_REINDEX_BATCH_SIZE = 20
+
+# The score a term gets for appearing in each part of a package. README terms
+# get _README_SCORE for each occurrence, up to _MAX_README_SCORE.
+_NAME_SCORE = 10
+_NAME_PART_SCORE = 5
+_LIBRARY_SCORE = 3
+_DESCRIPTION_SCORE = 2
+_README_SCORE = 1
+_MAX_README_SCORE = 3
+
+_TERM_RE = re.compile(r'[a-z0-9]+')
+
+# The words of a query that may be package names. Names can contain
+# underscores, which _TERM_RE splits on.
+_NAME_RE = re.compile(r'[a-z0-9_]+')
+
+# Words that appear in too many packages to narrow a search. They aren't
+# indexed, and are ignored in queries unless they're package names. Package
+# names are always indexed, even if they're stop words.
+_STOP_WORDS = frozenset("""
+    a an and are as at be but by can dart for from has have how if in into is it
+    its library lib main new not of on or package packages that the this to use
+    used using was will with you your
+    """.split())
+
+_terms = LRUCache(_TERM_CACHE_SIZE, ttl=_TERM_CACHE_TIME)
+
+class SearchTerm(db.Model):
+    """The postings for a single term in the search index.
+
+    The key name of each SearchTerm is its term.
+    """
+
+    postings = db.BlobProperty()
+    """A compressed JSON map from package names to scores."""
+
+    def get_postings(self):
+        """Return the decoded postings for this term."""
+        if not self.postings: return {}
+        return json.loads(zlib.decompress(self.postings))
+
+    def set_postings(self, postings):
+        """Encode and store the postings for this term.
+
+        If there are more than _MAX_POSTINGS, only the highest-scoring packages
+        are kept.
+        """
+        if len(postings) > _MAX_POSTINGS:
+            kept = sorted(postings, key=lambda name: (-postings[name], name))
+            postings = dict((name, postings[name])
+                            for name in kept[:_MAX_POSTINGS])
+        self.postings = zlib.compress(
+            json.dumps(postings, separators=(',', ':')))
+
+class SearchDocument(db.Model):
+    """The terms a package is currently indexed under.
+
+    This is used to remove the package's old terms from the index when it's
+    re-indexed. The key name of each document is the name of its package.
+    """
+
+    terms = db.BlobProperty()
+    """A JSON map from terms to the package's scores for them."""
+
+def index_package(name):
+    """Add or update a package in the search index.
+
+    This indexes the package's latest version. It's safe to run more than once
+    for the same package, and should be run whenever the package's latest
+    version changes.
+
+    A package's terms are each in their own entity group, so they can't be
+    updated in a single transaction. Instead, the terms are updated first and
+    the package's SearchDocument last. If this fails partway through, the
+    document still lists the package's old terms, so running this again
+    finishes the job.
+    """
+    package = Package.get_by_key_name(name)
+    new_terms = _package_terms(package) if package else {}
+
+    document = SearchDocument.get_by_key_name(name)
+    old_terms = json.loads(document.terms) if document else {}
+
+    # Only terms whose postings for this package change need to be written.
+    for term in set(old_terms) | set(new_terms):
+        score = new_terms.get(term)
+        if old_terms.get(term) != score: _update_term(term, name, score)
+
+    SearchDocument(key_name=name, terms=json.dumps(new_terms)).put()
+
+def reindex(cursor=None):
+    """Index every package, in a chain of tasks.
+
+    Each task indexes a batch of packages and defers the next batch. This
+    should be run with deferred.defer().
+
+    Arguments:
+      cursor: The query cursor after the last batch, or None to start from the
+        first package.
+    """
+    query = Package.all(keys_only=True).order('__key__')
+    if cursor is not None: query.with_cursor(cursor)
+    keys = query.fetch(_REINDEX_BATCH_SIZE)
+
+    for key in keys:
+        try:
+            index_package(key.name())
+        except Exception:
+            logging.exception('Failed to index package %s' % key.name())
+
+    if len(keys) < _REINDEX_BATCH_SIZE:
+        logging.info('Finished reindexing packages')
+        return
+    deferred.defer(reindex, query.cursor())
+
+def search(query):
+    """Return the names of the packages that match query, best match first.
+
+    A package matches if it's indexed under every term in the query, or if its
+    name appears in the query. Packages are ranked by the sum of their scores
+    for the query's terms and names.
+    """
+    terms, names = _parse_query(query)
+    if not terms and not names: return []
+
+    postings = _load_postings(terms | names)
+    scores = None
+    for term in terms:
+        matches = postings[term]
+        if scores is None:
+            scores = dict(matches)
+        else:
+            scores = dict((name, score + matches[name])
+                          for name, score in scores.iteritems()
+                          if name in matches)
+        if not scores: break
+
+    # Only package names are indexed under these, so each one matches at most
+    # the package it names.
+    scores = scores or {}
+    for name in names:
+        for package, score in postings[name].iteritems():
+            scores[package] = scores.get(package, 0) + score
+
+    return sorted(scores, key=lambda name: (-scores[name], name))
+
+def normalize_query(query):
+    """Return a canonical form of query.
+
+    Queries with the same normal form always have the same results.
+    """
+    terms, names = _parse_query(query)
+    return ' '.join(sorted(terms | names))
+
+def _parse_query(query):
+    """Split a query into its terms and the package names it may mention.
+
+    Each package's whole name is indexed as a term, but a name with an
+    underscore is split by tokenizing, and a name that's a stop word is
+    dropped. So each word of the query that isn't already one of its terms is
+    also looked up as a name.
+
+    Returns: A pair of sets, the terms every match must be indexed under and
+      the possible package names.
+    """
+    query = query.lower()
+    terms = set(_TERM_RE.findall(query)) - _STOP_WORDS
+    names = set(_NAME_RE.findall(query)) - terms
+    return terms, names
+
+def _package_terms(package):
+    """Return a map from the terms a package is indexed under to its scores."""
+    scores = defaultdict(int)
+    scores[package.name] += _NAME_SCORE
+    for term in _tokenize(package.name):
+        if term != package.name and term not in _STOP_WORDS:
+            scores[term] += _NAME_PART_SCORE
+
+    version = package.latest_version
+    if version is None: return dict(scores)
+
+    for library in version.libraries:
+        if library.endswith('.dart'): library = library[:-len('.dart')]
+        for term in set(_tokenize(library)) - _STOP_WORDS:
+            scores[term] += _LIBRARY_SCORE
+
+    description = version.pubspec.get('description') or ''
+    for term in set(_tokenize(description)) - _STOP_WORDS:
+        scores[term] += _DESCRIPTION_SCORE
+
+    readme = version.readme_obj
+    if readme is not None:
+        counts = defaultdict(int)
+        for term in _tokenize(readme.text):
+            if term not in _STOP_WORDS: counts[term] += 1
+        frequent = sorted(counts, key=lambda term: (-counts[term], term))
+        for term in frequent[:_MAX_README_TERMS]:
+            scores[term] += min(counts[term], _MAX_README_SCORE) * _README_SCORE
+
+    return dict(scores)
+
+def _tokenize(text):
+    """Split text into a list of search terms."""
+    return _TERM_RE.findall(text.lower())
+
+def _update_term(term, name, score):
+    """Update a package's posting for a single term.
+
+    Arguments:
+      term: The term to update.
+      name: The name of the package.
+      score: The package's new score for the term, or None if the package
+        should no longer be indexed under it.
+    """
+    def txn():
+        entity = SearchTerm.get_by_key_name(term)
+        if entity is None:
+            if score is None: return
+            entity = SearchTerm(key_name=term)
+
+        postings = entity.get_postings()
+        if score is None:
+            postings.pop(name, None)
+        else:
+            postings[name] = score
+
+        if postings:
+            entity.set_postings(postings)
+            entity.put()
+        else:
+            entity.delete()
+
+    db.run_in_transaction(txn)
+    _terms.delete(term)
+
+def _load_postings(terms):
+    """Return a map from each of the given terms to its postings.
+
+    Terms are loaded from the instance cache when possible, and the rest are
+    loaded from the datastore in a single batch.
+    """
+    postings = {}
+    missing = []
+    for term in terms:
+        cached = _terms.get(term)
+        if cached is None:
+            missing.append(term)
+        else:
+            postings[term] = cached
+
+    if missing:
+        entities = SearchTerm.get_by_key_name(missing)
+        for term, entity in zip(missing, entities):
+            postings[term] = entity.get_postings() if entity else {}
+            _terms.set(term, postings[term])
+
+    return postings
@@ -5,9 +5,23 @@
 import re
 from functools import total_ordering
 
+from lru_cache import LRUCache
+
+# The maximum number of parsed versions kept by the intern table.
+_MAX_INTERNED = 10000
+
 @total_ordering
 class SemanticVersion(object):
-    """A semantic version number. See http://semver.org/."""
+    """A semantic version number. See http://semver.org/.
+
+    Versions are immutable, so constructing a version from a string that's
+    already been parsed returns the same object rather than parsing the string
+    again. Each version computes the key it's compared by once, when it's
+    parsed.
+    """
+
+    __slots__ = ['major', 'minor', 'patch', 'prerelease', 'build', '_text',
+                 '_sort_key', '_encoded']
 
     _RE = re.compile(r"""
       ^
@@ -17,19 +31,35 @@ class SemanticVersion(object):
       $                                    # Consume entire string.
       """, re.VERBOSE | re.IGNORECASE)
 
-    def __init__(self, version):
+    _interned = LRUCache(_MAX_INTERNED)
+
+    def __new__(cls, version):
         """Parse a semantic version string."""
+        interned = cls._interned.get(version)
+        if interned is not None: return interned
 
         match = SemanticVersion._RE.match(version)
         if not match:
             raise ValueError('"%s" is not a valid semantic version.' % version)
 
+        self = super(SemanticVersion, cls).__new__(cls)
         self.major = int(match.group(1))
         self.minor = int(match.group(2))
         self.patch = int(match.group(3))
         self.prerelease = _split(match.group(4))
         self.build = _split(match.group(5))
         self._text = version
+        self._sort_key = (self.major, self.minor, self.patch,
+                          self._prerelease_key(), self._build_key())
+        self._encoded = None
+
+        cls._interned.set(version, self)
+        return self
+
+    def __reduce__(self):
+        # Versions are pickled as their text, so that unpickling goes through
+        # __new__ like any other construction.
+        return (SemanticVersion, (self._text,))
 
     @property
     def is_prerelease(self):
@@ -60,25 +90,48 @@ class SemanticVersion(object):
         return "%d.%d.%d%s%s" % (self.major, self.minor, self.patch, prerelease,
                                  build)
 
+    @property
+    def sort_key(self):
+        """A byte string that sorts the same way as this version.
+
+        Comparing two versions' sort keys as strings gives the same result as
+        comparing the versions themselves, so sort keys can be stored and
+        ordered by systems that know nothing about semantic versions.
+        """
+        if self._encoded is None:
+            self._encoded = ''.join([
+                _encode_int(self.major), _encode_int(self.minor),
+                _encode_int(self.patch),
+                # Prerelease versions sort before the release.
+                '\x02' if self.prerelease is None
+                    else '\x01' + _encode_components(self.prerelease),
+                # Versions without a build sort before those with one.
+                '' if self.build is None
+                    else '\x01' + _encode_components(self.build)
+            ])
+        return self._encoded
+
     def __eq__(self, other):
         if not isinstance(other, SemanticVersion): return False
-        return self._key() == other._key()
+        return self._sort_key == other._sort_key
 
     def __ne__(self, other):
         return not (self == other)
 
     def __lt__(self, other):
-        return self._key() < other._key()
+        return self._sort_key < other._sort_key
 
     def __cmp__(self, other):
         if not isinstance(other, SemanticVersion):
             other = SemanticVersion(other)
-        return cmp(self._key(), other._key())
+        return cmp(self._sort_key, other._sort_key)
+
+    def __hash__(self):
+        return hash(self._sort_key)
 
     def _key(self):
         """The key to use for equality and ordering comparisons."""
-        return (self.major, self.minor, self.patch,
-                self._prerelease_key(), self._build_key())
+        return self._sort_key
 
     def _prerelease_key(self):
         """The key to use for prerelease versions.
@@ -92,9 +145,10 @@ class SemanticVersion(object):
         integer components and a 1 for string components, since integers sort
         below strings in semver."""
 
-        if self.prerelease is None: return [1]
-        return [0] + [(0 if isinstance(subcomponent, int) else 1, subcomponent)
-                      for subcomponent in self.prerelease]
+        if self.prerelease is None: return (1,)
+        return (0,) + tuple((0 if isinstance(subcomponent, int) else 1,
+                             subcomponent)
+                            for subcomponent in self.prerelease)
 
     def _build_key(self):
         """The key to use for build versions.
@@ -105,8 +159,8 @@ class SemanticVersion(object):
         components, since integers sort below strings in semver."""
 
         if self.build is None: return None
-        return [(0 if isinstance(subcomponent, int) else 1, subcomponent)
-                for subcomponent in self.build]
+        return tuple((0 if isinstance(subcomponent, int) else 1, subcomponent)
+                     for subcomponent in self.build)
 
     def __str__(self): return self._text
 
@@ -125,3 +179,28 @@ def _split(string):
         if re.search(r'[^0-9]', substring): return substring
         return int(substring)
     return map(maybe_make_int, string.split('.'))
+
+def _encode_int(number):
+    """Encode a non-negative integer so that encodings sort numerically.
+
+    Longer numbers are larger, so the digits are prefixed with their count.
+    """
+    digits = str(number)
+    return chr(len(digits)) + digits
+
+def _encode_components(components):
+    """Encode the components of a prerelease or build string.
+
+    Numeric components sort below alphanumeric ones, and a list of components
+    sorts below any longer list it's a prefix of. Alphanumeric components only
+    contain characters above "\\x02", so the "\\x00" that terminates each one
+    sorts below anything that could follow.
+    """
+    encoded = []
+    for component in components:
+        if isinstance(component, int):
+            encoded.append('\x01' + _encode_int(component))
+        else:
+            encoded.append('\x02' + str(component) + '\x00')
+    encoded.append('\x00')
+    return ''.join(encoded)
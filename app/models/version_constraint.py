@@ -0,0 +1,152 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+from bisect import bisect_left, bisect_right
+import re
+
+from semantic_version import SemanticVersion
+
+_COMPARISON = re.compile(r"\s*(<=|>=|<|>)?\s*([^\s<>=]+)\s*")
+
+class VersionConstraint(object):
+    """A range of versions that a dependency allows, as written in a pubspec.
+
+    This supports "any", exact versions, caret constraints like "^1.2.0", and
+    space-separated comparisons like ">=1.0.0 <2.0.0".
+    """
+
+    def __init__(self, min=None, include_min=False, max=None,
+                 include_max=False):
+        self.min = min
+        self.include_min = include_min
+        self.max = max
+        self.include_max = include_max
+
+    @classmethod
+    def parse(cls, text):
+        """Parse a version constraint.
+
+        Raises a ValueError if text isn't a valid constraint.
+        """
+        text = text.strip()
+        if text in ['', 'any']: return cls()
+
+        if text.startswith('^'):
+            version = SemanticVersion(text[1:].strip())
+            return cls(min=version, include_min=True, max=_caret_max(version))
+
+        constraint = cls()
+        position = 0
+        while position < len(text):
+            match = _COMPARISON.match(text, position)
+            if not match:
+                raise ValueError('"%s" is not a valid version constraint.' %
+                                 text)
+            position = match.end()
+
+            operator = match.group(1)
+            version = SemanticVersion(match.group(2))
+            if operator is None:
+                constraint._restrict_min(version, True)
+                constraint._restrict_max(version, True)
+            elif operator[0] == '>':
+                constraint._restrict_min(version, operator == '>=')
+            else:
+                constraint._restrict_max(version, operator == '<=')
+        return constraint
+
+    def best_match(self, index):
+        """Return the best version in a version index that this allows.
+
+        Like a package's latest_version, the best version is the highest
+        release this allows, or the highest prerelease if it allows no
+        releases. The allowed range is found by binary search, and the highest
+        release in it is looked up in the index, so this takes logarithmic time
+        however many prereleases the package has.
+
+        Arguments:
+          index: A version index, as returned by version_index().
+
+        Returns: The best SemanticVersion, or None if no version is allowed.
+        """
+        keys, versions, releases = index
+
+        if self.min is None:
+            start = 0
+        elif self.include_min:
+            start = bisect_left(keys, self.min.sort_key)
+        else:
+            start = bisect_right(keys, self.min.sort_key)
+
+        if self.max is None:
+            end = len(keys)
+        elif self.include_max:
+            end = bisect_right(keys, self.max.sort_key)
+        else:
+            end = bisect_left(keys, self._exclusive_max().sort_key)
+
+        if end <= start: return None
+        release = releases[end - 1]
+        if release >= start: return SemanticVersion(versions[release])
+        return SemanticVersion(versions[end - 1])
+
+    def _exclusive_max(self):
+        """Return the lowest version that's too high for this constraint.
+
+        As in pub, "<2.0.0" also excludes prereleases of 2.0.0, unless the
+        minimum is itself a prerelease of 2.0.0.
+        """
+        max = self.max
+        if max.is_prerelease or max.build is not None: return max
+        if self.min is not None and self.min.is_prerelease and \
+                _release(self.min) == _release(max):
+            return max
+        return SemanticVersion('%d.%d.%d-0' % _release(max))
+
+    def _restrict_min(self, version, inclusive):
+        """Raise the minimum of this constraint to version if it's higher."""
+        if self.min is None or version > self.min or \
+                (version == self.min and not inclusive):
+            self.min = version
+            self.include_min = inclusive
+
+    def _restrict_max(self, version, inclusive):
+        """Lower the maximum of this constraint to version if it's lower."""
+        if self.max is None or version < self.max or \
+                (version == self.max and not inclusive):
+            self.max = version
+            self.include_max = inclusive
+
+def version_index(versions):
+    """Return an index of versions that best_match() can search.
+
+    This is a tuple of three parallel lists, in ascending version order: the
+    versions' sort keys, the versions' text, and for each version, the position
+    of the highest release at or before it, or -1 if there isn't one.
+
+    Arguments:
+      versions: The SemanticVersions to index, in any order.
+    """
+    keys = []
+    texts = []
+    releases = []
+    release = -1
+    for version in sorted(versions):
+        if not version.is_prerelease: release = len(keys)
+        keys.append(version.sort_key)
+        texts.append(str(version))
+        releases.append(release)
+    return (keys, texts, releases)
+
+def _release(version):
+    """Return the major, minor and patch numbers of a version."""
+    return (version.major, version.minor, version.patch)
+
+def _caret_max(version):
+    """Return the exclusive maximum of the caret constraint for version."""
+    if version.major > 0:
+        return SemanticVersion('%d.0.0' % (version.major + 1))
+    if version.minor > 0:
+        return SemanticVersion('0.%d.0' % (version.minor + 1))
+    return SemanticVersion('0.0.%d' % (version.patch + 1))
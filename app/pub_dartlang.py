@@ -24,13 +24,14 @@ from handlers.packages import Packages
 from handlers.package_uploaders import PackageUploaders
 from handlers.package_versions import PackageVersions
 from handlers.private_keys import PrivateKeys
+from handlers.routing import Dispatcher
 
 class Application(cherrypy.Application):
     """The pub.dartlang.org WSGI application."""
 
     def __init__(self, *args, **kwargs):
         super(Application, self).__init__(None, *args, **kwargs)
-        self.dispatcher = cherrypy.dispatch.RoutesDispatcher()
+        self.dispatcher = Dispatcher()
         self.merge({'/': {'request.dispatch': self.dispatcher}})
 
         # Frontend routes (also deprecated v1 API routes)
@@ -41,12 +42,17 @@ class Application(cherrypy.Application):
             '/site-map', controller='root', action='site_map')
         self.dispatcher.mapper.connect(
             '/admin', controller='root', action='admin')
+        self.dispatcher.mapper.connect(
+            '/_ah/warmup', controller='root', action='warmup')
         self.dispatcher.mapper.connect(
             '/gs_/{filename:.*?}', controller='root', action='serve')
 
         self.dispatcher.connect('feeds', '/feed.atom', Feeds(), action='atom')
 
         self.dispatcher.connect('search', '/search', Search(), action='index')
+        self.dispatcher.mapper.connect(
+            '/search/reindex', controller='search', action='reindex',
+            conditions={'method': 'POST'})
 
         self.dispatcher.connect('doc', '/doc', Doc(), action='index')
         self.dispatcher.connect('doc', '/doc/{path:.*?}', Doc(), action='show')
@@ -69,6 +75,8 @@ class Application(cherrypy.Application):
             m.connect('reload', action='reload', conditions={'method': 'POST'})
             m.connect('reload.:(format)', action='reload_status',
                       conditions={'method': 'GET'})
+            m.connect('downloads/roll-up', action='roll_up_downloads',
+                      conditions={'method': 'GET'})
 
         self._resource('uploader', 'uploaders', PackageUploaders(),
                        parent_resource={
@@ -82,7 +90,12 @@ class Application(cherrypy.Application):
         self.dispatcher.controllers['api.packages'] = api.Packages()
         self.dispatcher.mapper.resource(
             'package', 'packages',
-            controller='api.packages', path_prefix='api')
+            controller='api.packages', path_prefix='api',
+            member={'compact': 'GET'})
+        # This isn't under /api/packages/, where it could shadow a package.
+        self.dispatcher.mapper.connect(
+            '/api/batch/packages', controller='api.packages', action='batch',
+            conditions={'method': ['GET', 'HEAD']})
 
         self.dispatcher.controllers['api.versions'] = api.PackageVersions()
         self.dispatcher.mapper.resource(
@@ -93,6 +106,7 @@ class Application(cherrypy.Application):
                 'member_name': 'package',
                 'collection_name': 'packages'
             },
+            collection={'best': 'GET'},
             member={
                 'create': 'GET',
                 'new_dartdoc': 'GET'
@@ -129,6 +143,10 @@ class Application(cherrypy.Application):
             m.connect(':id/create.:(format)', action='create')
             m.connect('upload', action='upload', conditions={'method': 'POST'})
 
+        # The route set is fixed now, so build the routing table up front rather
+        # than on the first request.
+        self.dispatcher.mapper.create_regs()
+
         # Set up custom error page.
         cherrypy.config.update({'error_page.default': _error_page})
 
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""The entrypoint for running benchmarks.
+
+Like test.py, this can be run without an SDK_PATH argument if the App Engine
+dev_appserver.py is on $PATH.
+
+Results can be saved as JSON with --save, and compared against results saved
+from an earlier revision with --baseline. When comparing, this exits with a
+non-zero status if any endpoint regressed.
+"""
+
+import json
+import optparse
+import os
+import sys
+import subprocess
+
+USAGE = """%prog [SDK_PATH]
+Run benchmarks.
+
+SDK_PATH    Path to the SDK installation.
+            Auto-detected if dev_appserver.py is on $PATH."""
+
+parser = optparse.OptionParser(USAGE)
+parser.add_option('-n', '--name', help='only run benchmarks containing NAME',
+                  metavar='NAME')
+parser.add_option('--packages', type='int', default=100,
+                  help='the number of packages to seed [default: %default]')
+parser.add_option('--versions', type='int', default=10,
+                  help='the number of versions of each package '
+                       '[default: %default]')
+parser.add_option('--requests', type='int', default=100,
+                  help='the number of timed requests to each endpoint '
+                       '[default: %default]')
+parser.add_option('--warmup', type='int', default=5,
+                  help='the number of untimed requests to make first '
+                       '[default: %default]')
+parser.add_option('--cold', action='store_true', default=False,
+                  help='flush memcache before each request')
+parser.add_option('--save', metavar='FILE',
+                  help='save the results to FILE as JSON')
+parser.add_option('--baseline', metavar='FILE',
+                  help='compare the results to those saved in FILE')
+parser.add_option('--threshold', type='float', default=0.2,
+                  help='the fraction by which latency may grow before it '
+                       'counts as a regression [default: %default]')
+
+options, args = parser.parse_args()
+sdk_path = None
+if len(args) > 1:
+    print 'Error: 0 or 1 arguments required.'
+    parser.print_help()
+    sys.exit(1)
+elif len(args) == 1:
+    sdk_path = args[0]
+else:
+    process = subprocess.Popen(["which", "dev_appserver.py"],
+                               stdout=subprocess.PIPE)
+    stdout = process.communicate()[0]
+    if process.returncode > 0:
+        print('Error: could not find SDK path.')
+        parser.print_help()
+        sys.exit(1)
+    sdk_path = os.path.dirname(stdout.strip())
+
+sys.path.append(sdk_path)
+import dev_appserver
+dev_appserver.fix_sys_path()
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+sys.path.append(os.path.join(os.path.dirname(__file__), 'test'))
+
+import logging
+logging.disable(logging.INFO)
+
+from benchmarks import Benchmarks
+
+def revision():
+    """Return the git revision being benchmarked, or None if it's unknown."""
+    process = subprocess.Popen(["git", "rev-parse", "HEAD"],
+                               cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout = process.communicate()[0]
+    if process.returncode > 0: return None
+    return stdout.strip()
+
+def compare(baseline, results, threshold):
+    """Print how results differ from baseline.
+
+    Latency is noisy, so it only counts as a regression if the median or 90th
+    percentile grew by more than threshold. RPC counts are deterministic, so
+    any increase counts.
+
+    Returns: Whether anything regressed.
+    """
+    regressed = False
+    for name, result in sorted(results.iteritems()):
+        if name not in baseline: continue
+        old = baseline[name]
+        problems = []
+        for percentile in ['p50', 'p90']:
+            before = old['latency_ms'][percentile]
+            after = result['latency_ms'][percentile]
+            if after > before * (1 + threshold):
+                problems.append('%s latency %.1fms -> %.1fms' %
+                                (percentile, before, after))
+        if result['rpcs_total'] > old['rpcs_total']:
+            problems.append('RPCs %.1f -> %.1f' %
+                            (old['rpcs_total'], result['rpcs_total']))
+
+        if problems:
+            regressed = True
+            print 'REGRESSED %s: %s' % (name, '; '.join(problems))
+        else:
+            print 'ok        %s' % name
+    return regressed
+
+benchmarks = Benchmarks(packages=options.packages, versions=options.versions)
+results = benchmarks.run_all(requests=options.requests, warmup=options.warmup,
+                             cold=options.cold, name=options.name)
+
+print '%-20s %9s %9s %9s %9s %9s' % (
+    'benchmark', 'p50 ms', 'p90 ms', 'p99 ms', 'RPCs', 'retained')
+for name, result in sorted(results.iteritems()):
+    latency = result['latency_ms']
+    print '%-20s %9.1f %9.1f %9.1f %9.1f %9.0f' % (
+        name, latency['p50'], latency['p90'], latency['p99'],
+        result['rpcs_total'], result['objects_retained'])
+
+if options.save:
+    with open(options.save, 'w') as f:
+        json.dump({
+            'revision': revision(),
+            'config': {
+                'packages': options.packages,
+                'versions': options.versions,
+                'requests': options.requests,
+                'warmup': options.warmup,
+                'cold': options.cold
+            },
+            'results': results
+        }, f, indent=2, sort_keys=True)
+
+if options.baseline:
+    with open(options.baseline) as f:
+        baseline = json.load(f)
+    print
+    print 'Compared to %s:' % (baseline.get('revision') or options.baseline)
+    if compare(baseline['results'], results, options.threshold): sys.exit(1)
@@ -0,0 +1,296 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""Benchmarks for the app's most heavily used HTTP endpoints.
+
+Each benchmark seeds a synthetic registry into the same App Engine stubs the
+tests use, then makes the same request many times and records how long each
+one took, which App Engine API calls it made, and how many more objects were
+alive after it than before. See benchmark.py for the entrypoint.
+"""
+
+from collections import defaultdict
+import gc
+import json
+import math
+import random
+import time
+
+import cloudstorage
+import yaml
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import memcache
+
+from handlers import cloud_storage
+from models.package import Package
+from models.package_version import PackageVersion
+from models.pubspec import Pubspec
+from models.readme import Readme
+from testcase import TestCase
+
+# The words that synthetic descriptions and READMEs are made of.
+_WORDS = """
+    async stream future isolate widget parser server client http json yaml
+    test matcher mock build runner analyzer lint format path collection
+    quiver crypto convert logging args intl unicode regexp cache queue
+    """.split()
+
+class Registry(object):
+    """A synthetic package registry.
+
+    The registry is generated from a fixed seed, so every run sees the same
+    packages, versions, pubspecs and READMEs.
+    """
+
+    def __init__(self, packages, versions, seed=0):
+        """Create a new Registry.
+
+        Arguments:
+          packages: The number of packages in the registry.
+          versions: The number of versions of each package.
+          seed: The seed for the generated contents.
+        """
+        self._random = random.Random(seed)
+        self.names = ['package%d' % i for i in range(packages)]
+        self.versions = ['1.%d.0' % i for i in range(versions)]
+
+    def pubspec(self, name, version):
+        """Return a realistic pubspec for a package version.
+
+        Each package depends on a few of the packages before it, so the
+        dependency graph has the same shape as a real registry's.
+        """
+        index = self.names.index(name)
+        dependencies = {}
+        for other in self._random.sample(self.names[:index], min(index, 3)):
+            dependencies[other] = '^1.0.0'
+
+        return Pubspec(
+            name=name,
+            version=version,
+            description=self.sentence(12).capitalize() + '.',
+            authors=['Dart Team <misc@dartlang.org>',
+                     'Author %d <author%d@example.com>' % (index, index)],
+            homepage='https://github.com/dart-lang/%s' % name,
+            environment={'sdk': '>=1.8.0 <2.0.0'},
+            dependencies=dependencies,
+            dev_dependencies={'test': '^0.12.0'})
+
+    def readme(self, name):
+        """Return a realistic Markdown README for a package."""
+        sections = ['# %s\n\n%s\n' % (name, self.paragraph())]
+        for _ in range(4):
+            sections.append('## %s\n\n%s\n\n' % (
+                self.sentence(3).capitalize(), self.paragraph()))
+            sections.append(''.join('* %s\n' % self.sentence(6)
+                                    for _ in range(5)))
+            sections.append('\n```dart\nimport "package:%s/%s.dart";\n\n'
+                            'main() => print("%s");\n```\n\n' %
+                            (name, name, self.sentence(4)))
+        return Readme(''.join(sections), 'README.md')
+
+    def paragraph(self):
+        """Return a paragraph of random words."""
+        return ' '.join(self.sentence(15) + '.' for _ in range(5))
+
+    def sentence(self, words):
+        """Return a string of random words."""
+        return ' '.join(self._random.choice(_WORDS) for _ in range(words))
+
+    def seed(self, uploader_email, archive):
+        """Store the registry in the datastore and cloud storage.
+
+        Arguments:
+          uploader_email: The email of the uploader of every package.
+          archive: A function that returns the .tar.gz archive for a pubspec
+            and README.
+        """
+        for name in self.names:
+            package = Package.new(name=name, uploaderEmails=[uploader_email])
+            package.put()
+
+            readme = self.readme(name)
+            for version_number in self.versions:
+                pubspec = self.pubspec(name, version_number)
+                version = PackageVersion.new(
+                    package=package, pubspec=pubspec, readme=readme,
+                    libraries=['%s.dart' % name], uploaderEmail=uploader_email)
+                version.assign_sort_order()
+                version.put()
+
+                with cloudstorage.open(cloud_storage._gcs_appengine_object_path(
+                        version.storage_path), 'w') as f:
+                    f.write(archive(pubspec, readme))
+
+            package.latest_version = version
+            package.invalidate_cache()
+            package.put()
+
+class Benchmarks(TestCase):
+    """The benchmarks for the app's HTTP endpoints.
+
+    Each method whose name starts with "benchmark_" returns a function that
+    makes one request to the endpoint being measured. If it returns a pair of
+    functions instead, the first is run untimed before each request to prepare
+    for it.
+    """
+
+    def __init__(self, packages=100, versions=10):
+        super(Benchmarks, self).__init__('run_all')
+        self.registry = Registry(packages, versions)
+        self._rpcs = defaultdict(int)
+        self._uploads = 0
+
+    def run_all(self, requests=100, warmup=5, cold=False, name=None):
+        """Run every benchmark.
+
+        Arguments:
+          requests: The number of timed requests to make to each endpoint.
+          warmup: The number of untimed requests to make first, so that lazily
+            built documents and caches are in place.
+          cold: Whether to flush memcache before each request.
+          name: If given, only benchmarks whose names contain this are run.
+
+        Returns: A map from each benchmark's name to its results. See
+          _summarize().
+        """
+        self.setUp()
+        try:
+            apiproxy_stub_map.apiproxy.GetPreCallHooks().Append(
+                'benchmark', self._count_rpc)
+            self.be_admin_oauth_user()
+            self.registry.seed(self.admin_user().email(), self._archive)
+
+            results = {}
+            for method in sorted(dir(self)):
+                if not method.startswith('benchmark_'): continue
+                benchmark = method[len('benchmark_'):]
+                if name is not None and name not in benchmark: continue
+                results[benchmark] = self._measure(
+                    getattr(self, method)(), requests, warmup, cold)
+            return results
+        finally:
+            self.tearDown()
+
+    def benchmark_api_package(self):
+        name = self.registry.names[0]
+        return lambda: self.testapp.get('/api/packages/' + name)
+
+    def benchmark_package_page(self):
+        name = self.registry.names[0]
+        return lambda: self.testapp.get('/packages/' + name)
+
+    def benchmark_packages_index(self):
+        return lambda: self.testapp.get('/packages')
+
+    def benchmark_feed(self):
+        return lambda: self.testapp.get('/feed.atom')
+
+    def benchmark_upload_create(self):
+        state = {}
+        def prepare():
+            self._uploads += 1
+            path = self._start_upload(self.upload_archive(
+                self.registry.names[-1], '2.0.%d' % self._uploads))
+            state['path'] = path
+        def create():
+            response = self.testapp.get(state['path'])
+            self.assert_json_success(response)
+        return prepare, create
+
+    def _archive(self, pubspec, readme):
+        """Return a package archive with a pubspec, README and library."""
+        name = pubspec['name']
+        return self.io_for_archive({
+            'pubspec.yaml': yaml.dump(dict(pubspec)),
+            'README.md': readme.text.encode('utf-8'),
+            'lib/%s.dart' % name: 'library %s;\n' % name
+        }).getvalue()
+
+    def _start_upload(self, upload):
+        """Upload a package archive to cloud storage.
+
+        Returns: The path of the request that creates the package version.
+        """
+        response = self.testapp.get('/api/packages/versions/new')
+        content = json.loads(response.body)
+        response = self.testapp.post(str(content['url']), content['fields'],
+                                     upload_files=[upload])
+        return response.headers['Location'].replace('http://localhost:80', '')
+
+    def _measure(self, benchmark, requests, warmup, cold):
+        """Time the requests made by a benchmark.
+
+        Objects are counted with the garbage collector's generation 0 count,
+        which is the number of container objects (lists, dicts, instances and
+        so on) allocated minus the number freed. So this measures the net
+        growth in live objects over a request rather than how many it
+        allocated: objects that are created and freed within the request
+        aren't counted, and strings and numbers never are. The collector is
+        paused during each request so that the count isn't reset partway
+        through.
+        """
+        prepare, request = benchmark if isinstance(benchmark, tuple) \
+            else (None, benchmark)
+
+        samples = []
+        for i in range(warmup + requests):
+            if prepare is not None: prepare()
+            if cold: memcache.flush_all()
+
+            self._rpcs.clear()
+            gc.collect()
+            gc.disable()
+            try:
+                retained = gc.get_count()[0]
+                start = time.time()
+                request()
+                elapsed = time.time() - start
+                retained = gc.get_count()[0] - retained
+            finally:
+                gc.enable()
+
+            if i >= warmup:
+                samples.append((elapsed * 1000, dict(self._rpcs), retained))
+        return _summarize(samples)
+
+    def _count_rpc(self, service, call, request, response):
+        """Record an App Engine API call. This is an apiproxy pre-call hook."""
+        self._rpcs['%s.%s' % (service, call)] += 1
+
+def _summarize(samples):
+    """Summarize the measurements of a benchmark's requests.
+
+    Arguments:
+      samples: A list of (milliseconds, RPC counts, objects retained) tuples,
+        one for each request. See _measure() for how objects are counted.
+
+    Returns: A JSON-compatible map with the latency percentiles in
+      milliseconds, the mean number of each kind of RPC per request, and the
+      mean net growth in live objects per request.
+    """
+    latencies = sorted(sample[0] for sample in samples)
+    rpcs = defaultdict(int)
+    for _, counts, _ in samples:
+        for call, count in counts.iteritems(): rpcs[call] += count
+
+    count = float(len(samples))
+    return {
+        'requests': len(samples),
+        'latency_ms': {
+            'mean': sum(latencies) / count,
+            'p50': _percentile(latencies, 50),
+            'p90': _percentile(latencies, 90),
+            'p99': _percentile(latencies, 99),
+            'max': latencies[-1]
+        },
+        'rpcs': dict((call, total / count) for call, total in rpcs.iteritems()),
+        'rpcs_total': sum(rpcs.itervalues()) / count,
+        'objects_retained': sum(sample[2] for sample in samples) / count
+    }
+
+def _percentile(values, percentile):
+    """Return a percentile of a sorted list, using the nearest-rank method."""
+    rank = int(math.ceil(percentile / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
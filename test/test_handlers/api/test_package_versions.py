@@ -7,8 +7,10 @@ import json
 
 import handlers
 from models.package import Package
+from models.package_feed import FeedEntry, PackageFeed
 from models.package_version import PackageVersion
 from models.private_key import PrivateKey
+from models.recent_packages import RecentPackages
 from models.semantic_version import SemanticVersion
 from testcase import TestCase
 
@@ -74,6 +76,20 @@ class PackageVersionsTest(TestCase):
                                     status=500)
         self.assert_json_error(response)
 
+    def test_api_caches_oauth_user_by_bearer_token(self):
+        self.be_admin_oauth_user()
+        headers = {'Authorization': 'Bearer token'}
+        self.testapp.get('/api/packages/versions/new', headers=headers)
+
+        # The token's user is remembered even if it can no longer be checked.
+        self.dont_be_oauth_user()
+        self.testapp.get('/api/packages/versions/new', headers=headers)
+
+        response = self.testapp.get(
+            '/api/packages/versions/new',
+            headers={'Authorization': 'Bearer other-token'}, status=401)
+        self.assert_json_error(response)
+
     def test_api_uploader_creates_package_version(self):
         self.be_normal_oauth_user('other-uploader')
         self.post_package_version('1.2.3')
@@ -183,19 +199,102 @@ class PackageVersionsTest(TestCase):
         self.be_admin_oauth_user()
 
         self.post_package_version('1.2.3')
+        self.post_package_version('1.2.4')
+        self.post_package_version('1.2.4-pre')
+        self.assert_sort_order(['1.2.3', '1.2.4-pre', '1.2.4'])
+
+    def test_api_create_only_writes_new_version_when_there_is_room(self):
+        self.be_admin_oauth_user()
+
+        self.post_package_version('1.2.3')
+        self.post_package_version('1.2.5')
+        sort_order = self.get_package_version('1.2.5').sort_order
+
+        self.post_package_version('1.2.4')
+        self.assertEqual(sort_order,
+                         self.get_package_version('1.2.5').sort_order)
+        self.assert_sort_order(['1.2.3', '1.2.4', '1.2.5'])
+
+    def test_api_create_renumbers_versions_when_there_is_no_room(self):
+        self.be_admin_oauth_user()
+
+        self.post_package_version('1.2.3')
+        self.post_package_version('1.2.5')
+        version = self.get_package_version('1.2.5')
+        version.sort_order = self.get_package_version('1.2.3').sort_order + 1
+        version.put()
+
+        self.post_package_version('1.2.4')
+        self.assert_sort_order(['1.2.3', '1.2.4', '1.2.5'])
+
+    def test_api_create_increments_package_count(self):
+        self.be_normal_oauth_user()
+        self.assertEqual(Package.total_count(), 1)
+
+        self.post_package_version(name='new-package', version='0.0.1')
+        self.post_package_version(name='new-package', version='0.0.2')
         self.run_deferred_tasks()
-        self.assertEqual(self.get_package_version('1.2.3').sort_order, 0)
+        self.assertEqual(Package.total_count(), 2)
+
+    def test_api_create_changes_listing_generation(self):
+        self.be_admin_oauth_user()
+        generation = Package.listing_generation()
 
         self.post_package_version('1.2.4')
         self.run_deferred_tasks()
-        self.assertEqual(self.get_package_version('1.2.3').sort_order, 0)
-        self.assertEqual(self.get_package_version('1.2.4').sort_order, 1)
+        self.assertNotEqual(Package.listing_generation(), generation)
 
-        self.post_package_version('1.2.4-pre')
+        # A version that isn't the new latest version doesn't change the
+        # order of packages.
+        generation = Package.listing_generation()
+        self.post_package_version('1.0.0')
         self.run_deferred_tasks()
-        self.assertEqual(self.get_package_version('1.2.3').sort_order, 0)
-        self.assertEqual(self.get_package_version('1.2.4-pre').sort_order, 1)
-        self.assertEqual(self.get_package_version('1.2.4').sort_order, 2)
+        self.assertEqual(Package.listing_generation(), generation)
+
+    def test_api_create_updates_listings_after_commit(self):
+        # Store the listings before the upload, so that they can only include
+        # the new package if the upload's tasks update them.
+        RecentPackages.get_packages(10)
+        PackageFeed.get_validators()
+
+        self.be_normal_oauth_user()
+        self.post_package_version(name='new-package', version='0.0.1')
+        self.run_deferred_tasks()
+
+        self.assertEqual(Package.total_count(), 2)
+        self.assertEqual(RecentPackages.get_packages(1)[0]['name'],
+                         'new-package')
+        self.assertIsNotNone(FeedEntry.get_by_key_name(
+            'new-package', parent=PackageFeed.get_by_key_name('atom')))
+
+    def test_api_best_finds_matching_version(self):
+        self.be_admin_oauth_user()
+        for version in ['1.0.0', '1.2.0', '2.0.0']:
+            self.post_package_version(version)
+
+        response = self.testapp.get(
+            '/api/packages/test-package/versions/best', {'constraint': '^1.0.0'})
+        self.assertEqual(json.loads(response.body)['version'], '1.2.0')
+
+        # Uploading a new version rebuilds the index.
+        self.post_package_version('1.3.0')
+        response = self.testapp.get(
+            '/api/packages/test-package/versions/best', {'constraint': '^1.0.0'})
+        self.assertEqual(json.loads(response.body)['version'], '1.3.0')
+
+    def test_api_best_without_match(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.0.0')
+
+        response = self.testapp.get(
+            '/api/packages/test-package/versions/best', {'constraint': '^2.0.0'},
+            status=404)
+        self.assert_json_error(response)
+
+        response = self.testapp.get(
+            '/api/packages/test-package/versions/best', {'constraint': 'foo'},
+            status=400)
+        self.assert_json_error(response)
 
     def test_api_show_package_version(self):
         version = self.package_version(self.package, '1.2.3')
@@ -279,6 +378,12 @@ class PackageVersionsTest(TestCase):
     def latest_version(self):
         return Package.get_by_key_name('test-package').latest_version.version
 
+    def assert_sort_order(self, versions):
+        """Assert that the given versions have increasing sort orders."""
+        sort_orders = [self.get_package_version(version).sort_order
+                       for version in versions]
+        self.assertEqual(sorted(set(sort_orders)), sort_orders)
+
     def get_package_version(self, version):
         return PackageVersion.get_by_name_and_version('test-package', version)
 
@@ -3,8 +3,12 @@
 # BSD-style license that can be found in the LICENSE file.
 
 import json
+import zlib
+
+from google.appengine.api import memcache
 
 from models.package import Package
+from models.package_document import PackageDocument
 from testcase import TestCase
 
 class PackagesTest(TestCase):
@@ -176,6 +180,40 @@ class PackagesTest(TestCase):
             self.package_version_dict("test-package", "1.2.3")
         ])
 
+    def test_api_get_package_reads_stored_document(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+        memcache.flush_all()
+
+        # Replace the stored document to make sure it's what gets served,
+        # rather than a freshly-built one.
+        package = Package.get_by_key_name('test-package')
+        document = PackageDocument.get_for(package)
+        self.assertEqual(document.generation, package.generation)
+        document.json = json.dumps({'stored': True})
+        document.put()
+
+        response = self.testapp.get('/api/packages/test-package')
+        self.assertEqual(json.loads(response.body), {'stored': True})
+
+    def test_api_get_package_rebuilds_stale_document(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+
+        package = Package.get_by_key_name('test-package')
+        document = PackageDocument.get_for(package)
+        document.json = json.dumps({'stored': True})
+        document.generation -= 1
+        document.put()
+        memcache.flush_all()
+
+        response = self.testapp.get('/api/packages/test-package')
+        self.assertEqual(json.loads(response.body)["versions"], [
+            self.package_version_dict("test-package", "1.2.3")
+        ])
+        self.assertEqual(PackageDocument.get_for(package).generation,
+                         package.generation)
+
     def _cache_test_package(self):
         """Create a test package and request its details so that the memcache
         is populated with it.
@@ -190,3 +228,116 @@ class PackagesTest(TestCase):
         # Request the package once to cache it.
         response = self.testapp.get('/api/packages/test-package')
         self.assertEqual(response.status_int, 200)
+
+    def test_api_get_package_is_not_modified_for_current_etag(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+
+        response = self.testapp.get('/api/packages/test-package')
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+
+        response = self.testapp.get('/api/packages/test-package',
+                                    headers={'If-None-Match': etag},
+                                    status=304)
+        self.assertEqual(response.body, '')
+
+        # A new upload changes the document, so the old tag no longer matches.
+        self.post_package_version('1.2.4')
+        response = self.testapp.get('/api/packages/test-package',
+                                    headers={'If-None-Match': etag},
+                                    status=200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_api_get_package_gzipped(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+        response = self.testapp.get('/api/packages/test-package')
+
+        gzipped = self.testapp.get('/api/packages/test-package',
+                                   headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(gzipped.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzipped.headers['Vary'], 'Accept-Encoding')
+        self.assertNotEqual(gzipped.headers['ETag'], response.headers['ETag'])
+        self.assertEqual(zlib.decompress(gzipped.body, 16 + zlib.MAX_WBITS),
+                         response.body)
+
+    def test_api_batch_gets_several_packages(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+        self.post_package_version(name='other-package', version='0.0.1')
+        expected = {
+            'test-package':
+                json.loads(self.testapp.get('/api/packages/test-package').body),
+            'other-package':
+                json.loads(self.testapp.get('/api/packages/other-package').body)
+        }
+
+        # The first request caches the documents, and the second reads them
+        # from memcache. After memcache is flushed, the third reads the stored
+        # documents again.
+        for flush in [False, False, True]:
+            if flush: memcache.flush_all()
+            response = self.testapp.get('/api/batch/packages', {
+                'names': 'test-package,other-package,nonexistent'
+            })
+            self.assertEqual(response.headers['Content-Type'],
+                             'application/json')
+            self.assertEqual(json.loads(response.body)['packages'], expected)
+
+    def test_api_batch_sees_upload(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+        self.testapp.get('/api/batch/packages', {'names': 'test-package'})
+
+        self.post_package_version('1.2.4')
+        response = self.testapp.get('/api/batch/packages',
+                                    {'names': 'test-package'})
+        versions = json.loads(response.body)['packages']['test-package'][
+            'versions']
+        self.assertEqual([version['version'] for version in versions],
+                         ['1.2.3', '1.2.4'])
+
+    def test_api_batch_limits_package_count(self):
+        names = ','.join('package%d' % i for i in range(201))
+        response = self.testapp.get('/api/batch/packages', {'names': names},
+                                    status=400)
+        self.assert_json_error(response)
+
+    def test_api_compact_lists_versions(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+
+        response = self.testapp.get('/api/packages/test-package/compact')
+        self.assertEqual(response.headers['Content-Type'], 'application/json')
+        result = json.loads(response.body)
+        generation = Package.get_by_key_name('test-package').generation
+        self.assertEqual(result, {
+            'name': 'test-package',
+            'generation': generation,
+            'versions': [{
+                'version': '1.2.3',
+                'sdk': None,
+                'dependencies': {},
+                'generation': generation
+            }]
+        })
+
+    def test_api_compact_lists_versions_since_generation(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+        response = self.testapp.get('/api/packages/test-package/compact')
+        generation = json.loads(response.body)['generation']
+
+        self.post_package_version('1.2.4')
+        response = self.testapp.get('/api/packages/test-package/compact',
+                                    {'since': str(generation)})
+        result = json.loads(response.body)
+        self.assertTrue(result['generation'] > generation)
+        self.assertEqual([version['version'] for version in result['versions']],
+                         ['1.2.4'])
+
+        response = self.testapp.get('/api/packages/test-package/compact')
+        self.assertEqual([version['version'] for version
+                          in json.loads(response.body)['versions']],
+                         ['1.2.3', '1.2.4'])
@@ -0,0 +1,90 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+from testcase import TestCase
+from models.package_feed import FeedEntry, PackageFeed
+
+class FeedTest(TestCase):
+    def test_feed_lists_packages_in_update_order(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.0.0', name='armadillo')
+        self.post_package_version('1.0.0', name='zebra')
+
+        response = self.testapp.get('/feed.atom')
+        self.assertEqual(response.headers['Content-Type'],
+                         'application/atom+xml')
+        self.assertLess(response.body.index('v1.0.0 of zebra'),
+                        response.body.index('v1.0.0 of armadillo'))
+        self.assertIn('This is a README.', response.body)
+
+    def test_upload_updates_stored_feed(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.0.0', name='armadillo')
+        self.post_package_version('1.0.0', name='zebra')
+        self.testapp.get('/feed.atom')
+
+        self.post_package_version('1.0.1', name='armadillo')
+        self.run_deferred_tasks()
+        response = self.testapp.get('/feed.atom')
+        self.assertNotIn('v1.0.0 of armadillo', response.body)
+        self.assertLess(response.body.index('v1.0.1 of armadillo'),
+                        response.body.index('v1.0.0 of zebra'))
+        self.assertEqual(FeedEntry.all().count(), 2)
+
+    def test_upload_drops_oldest_entry_from_full_feed(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.0.0', name='armadillo')
+        self.post_package_version('1.0.0', name='zebra')
+        self.testapp.get('/feed.atom')
+
+        original = PackageFeed.PAGES
+        PackageFeed.PAGES = 1
+        original_per_page = PackageFeed.PER_PAGE
+        PackageFeed.PER_PAGE = 2
+        try:
+            self.post_package_version('1.0.0', name='mongoose')
+            self.run_deferred_tasks()
+        finally:
+            PackageFeed.PAGES = original
+            PackageFeed.PER_PAGE = original_per_page
+
+        self.assertEqual(
+            sorted(entry.key().name() for entry in FeedEntry.all()),
+            ['mongoose', 'zebra'])
+
+    def test_feed_is_not_modified_for_current_etag(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.0.0', name='armadillo')
+
+        response = self.testapp.get('/feed.atom')
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+        self.testapp.get('/feed.atom', headers={'If-None-Match': etag},
+                         status=304)
+
+        self.post_package_version('1.0.0', name='zebra')
+        self.run_deferred_tasks()
+        response = self.testapp.get('/feed.atom',
+                                    headers={'If-None-Match': etag})
+        self.assertEqual(response.status_int, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_reload_refreshes_stored_entry(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.0.0', name='armadillo')
+        self.run_deferred_tasks()
+        self.testapp.get('/feed.atom')
+
+        entry = FeedEntry.all().get()
+        entry.xml = '<entry>stale</entry>'
+        entry.put()
+
+        self.be_admin_user()
+        self.testapp.post('/packages/versions/reload')
+        self.run_deferred_tasks()
+        self.run_deferred_tasks()
+
+        response = self.testapp.get('/feed.atom')
+        self.assertNotIn('stale', response.body)
+        self.assertIn('v1.0.0 of armadillo', response.body)
@@ -7,10 +7,15 @@ import json
 import yaml
 
 from google.appengine.api import users
+from google.appengine.ext.testbed import TASKQUEUE_SERVICE_NAME
 
 import handlers
+from handlers import cloud_storage
 from testcase import TestCase
+from models.download_shard import DownloadShard
 from models.package import Package
+from models.package_document import PackageDocument
+from models.package_reload import PackageReload
 from models.package_version import PackageVersion
 from models.private_key import PrivateKey
 from models.semantic_version import SemanticVersion
@@ -68,6 +73,7 @@ class PackageVersionsTest(TestCase):
             '/packages/test-package/versions/1.2.4.tar.gz')
 
         self.run_deferred_tasks()
+        self.roll_up_downloads()
         version = self.get_package_version('1.2.3')
         self.assertEqual(version.downloads, 1)
         self.assertEqual(version.package.downloads, 2)
@@ -79,6 +85,7 @@ class PackageVersionsTest(TestCase):
             '/packages/test-package/versions/1.2.3.tar.gz')
 
         self.run_deferred_tasks()
+        self.roll_up_downloads()
         version = self.get_package_version('1.2.3')
         self.assertEqual(version.downloads, 2)
         self.assertEqual(version.package.downloads, 3)
@@ -86,6 +93,50 @@ class PackageVersionsTest(TestCase):
         self.assertEqual(version.downloads, 1)
         self.assertEqual(version.package.downloads, 3)
 
+    def test_show_package_version_tar_gz_buffers_downloads(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+
+        self.testapp.get('/packages/test-package/versions/1.2.3.tar.gz')
+        self.testapp.get('/packages/test-package/versions/1.2.3.tar.gz')
+        self.assertEqual(0, DownloadShard.all().count())
+
+        # Both downloads are flushed by the same task.
+        self.run_deferred_tasks()
+        self.assertEqual(
+            2, sum(shard.count for shard in DownloadShard.all().run()))
+        self.assertEqual(0, self.get_package_version('1.2.3').downloads)
+
+        self.roll_up_downloads()
+        self.assertEqual(
+            0, sum(shard.count for shard in DownloadShard.all().run()))
+        self.assertEqual(2, self.get_package_version('1.2.3').downloads)
+
+    def test_roll_up_downloads_keeps_generation(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+        generation = Package.get_by_key_name('test-package').generation
+        self.testapp.get('/api/packages/test-package')
+
+        self.testapp.get('/packages/test-package/versions/1.2.3.tar.gz')
+        self.run_deferred_tasks()
+        self.roll_up_downloads()
+
+        package = Package.get_by_key_name('test-package')
+        self.assertEqual(package.generation, generation)
+        self.assertEqual(package.downloads_generation, 1)
+
+        # The full document was rebuilt by the roll-up, so the API serves the
+        # new count without rebuilding it.
+        document = PackageDocument.get_for(package)
+        self.assertTrue(document.describes(package))
+        response = self.testapp.get('/api/packages/test-package')
+        self.assertEqual(json.loads(response.body)['downloads'], 1)
+
+    def test_roll_up_downloads_requires_admin(self):
+        self.be_normal_user()
+        self.testapp.get('/packages/versions/downloads/roll-up', status=403)
+
     def test_show_package_version_yaml(self):
         version = self.package_version(self.package, '1.2.3',
             description="Test package!",
@@ -101,6 +152,29 @@ class PackageVersionsTest(TestCase):
                          'text/yaml;charset=utf-8')
         self.assertEqual(yaml.load(response.body), version.pubspec)
 
+    def test_show_package_version_yaml_is_not_modified_for_current_etag(self):
+        self.package_version(self.package, '1.2.3').put()
+
+        response = self.testapp.get(
+            '/packages/test-package/versions/1.2.3.yaml')
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+
+        response = self.testapp.get(
+            '/packages/test-package/versions/1.2.3.yaml',
+            headers={'If-None-Match': etag}, status=304)
+        self.assertEqual(response.body, '')
+
+        self.testapp.get('/packages/test-package/versions/1.2.4.yaml',
+                         headers={'If-None-Match': etag}, status=404)
+
+        # The pubspec can't change, so changes to the package don't change the
+        # tag.
+        self.package.invalidate_cache()
+        self.package.put()
+        self.testapp.get('/packages/test-package/versions/1.2.3.yaml',
+                         headers={'If-None-Match': etag}, status=304)
+
     def test_uploader_gets_dartdoc_form(self):
         self.be_normal_oauth_user('other-uploader')
         self.post_package_version('1.2.3')
@@ -149,21 +223,19 @@ class PackageVersionsTest(TestCase):
         self.post_package_version('1.2.4')
         self.post_package_version('1.2.4-pre')
 
+        versions = ['1.2.3', '1.2.4-pre', '1.2.4']
+        sort_orders = [PackageVersion.get_by_name_and_version(
+                           'test-package', version).sort_order
+                       for version in versions]
+
         self.be_admin_user()
         self.testapp.post('/packages/versions/reload')
         self.run_deferred_tasks()
 
-        version = PackageVersion.get_by_name_and_version(
-            'test-package', '1.2.3')
-        self.assertEqual(0, version.sort_order)
-
-        version = PackageVersion.get_by_name_and_version(
-            'test-package', '1.2.4-pre')
-        self.assertEqual(1, version.sort_order)
-
-        version = PackageVersion.get_by_name_and_version(
-            'test-package', '1.2.4')
-        self.assertEqual(2, version.sort_order)
+        self.assertEqual(sort_orders,
+                         [PackageVersion.get_by_name_and_version(
+                              'test-package', version).sort_order
+                          for version in versions])
 
     def test_reload_preserves_downloads(self):
         self.be_admin_oauth_user()
@@ -171,6 +243,8 @@ class PackageVersionsTest(TestCase):
 
         response = self.testapp.get(
             '/packages/test-package/versions/1.2.3.tar.gz')
+        self.run_deferred_tasks()
+        self.roll_up_downloads()
 
         self.be_admin_user()
         self.testapp.post('/packages/versions/reload')
@@ -180,6 +254,66 @@ class PackageVersionsTest(TestCase):
             'test-package', '1.2.3')
         self.assertEqual(1, version.downloads)
 
+    def test_reload_tracks_status_in_datastore(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+        self.post_package_version('1.2.4')
+
+        self.be_admin_user()
+        self.testapp.post('/packages/versions/reload')
+        self.assertEqual({'total': 2, 'count': 0},
+                         PackageVersion.get_reload_status())
+
+        self.run_deferred_tasks()
+        self.assertIsNone(PackageVersion.get_reload_status())
+
+    def test_reload_resumes_unfinished_reload(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+
+        self.be_admin_user()
+        self.testapp.post('/packages/versions/reload')
+        self.testapp.post('/packages/versions/reload')
+        self.run_deferred_tasks()
+
+        self.assertEqual(1, PackageReload.all().count())
+        self.assertIsNone(PackageVersion.get_reload_status())
+
+    def test_reload_does_not_restart_running_shards(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+        self.run_deferred_tasks()
+
+        self.be_admin_user()
+        self.testapp.post('/packages/versions/reload')
+        taskqueue_stub = self.testbed.get_stub(TASKQUEUE_SERVICE_NAME)
+        tasks = len(taskqueue_stub.GetTasks('default'))
+
+        self.testapp.post('/packages/versions/reload')
+        self.assertEqual(tasks, len(taskqueue_stub.GetTasks('default')))
+
+    def test_reload_skips_versions_that_fail(self):
+        self.be_admin_oauth_user()
+        self.post_package_version('1.2.3')
+        self.post_package_version('1.2.4')
+
+        version = PackageVersion.get_by_name_and_version(
+            'test-package', '1.2.3')
+        cloud_storage.delete_object(version.storage_path)
+        version = PackageVersion.get_by_name_and_version(
+            'test-package', '1.2.4')
+        version.libraries = ["wrong"]
+        version.put()
+
+        self.be_admin_user()
+        self.testapp.post('/packages/versions/reload')
+        self.run_deferred_tasks()
+
+        version = PackageVersion.get_by_name_and_version(
+            'test-package', '1.2.4')
+        self.assertEqual([], version.libraries)
+        self.assertIsNone(PackageVersion.get_reload_status())
+
     def test_package_versions_are_indexed_by_canonical_version(self):
         self.be_admin_oauth_user()
         self.post_package_version('1.2.3')
@@ -199,6 +333,10 @@ class PackageVersionsTest(TestCase):
                          'http://localhost:80/gs_/packages/' +
                          'test-package-3.4.5.tar.gz')
 
+    def roll_up_downloads(self):
+        self.testapp.get('/packages/versions/downloads/roll-up',
+                         headers={'X-AppEngine-Cron': 'true'})
+
     def post_package_version(self, version, name='test-package'):
         response = self._upload_package(self.upload_archive(name, version))
         self.assert_json_success(response)
@@ -54,6 +54,24 @@ class PackagesTest(TestCase):
         # Only the ten most recent packages should be listed
         self.expect_lists_packages(['bat', 'armadillo'], page=2)
 
+    def test_page_two_after_page_one_lists_second_page_of_packages(self):
+        self.be_admin_user()
+
+        packages = [
+            'armadillo', 'bat', 'crocodile', 'dragon', 'elephant', 'frog',
+            'gorilla', 'headcrab', 'ibex', 'jaguar', 'kangaroo', 'llama'
+        ]
+
+        for package in packages:
+            self.create_package(package, '1.0.0')
+
+        # Viewing the first page caches a cursor that the second page starts
+        # from.
+        self.expect_lists_packages([
+                'llama', 'kangaroo', 'jaguar', 'ibex', 'headcrab', 'gorilla',
+                'frog', 'elephant', 'dragon', 'crocodile'])
+        self.expect_lists_packages(['bat', 'armadillo'], page=2)
+
     def test_index_json_lists_one_page_of_packages(self):
         self.be_admin_user()
 
@@ -103,6 +121,33 @@ class PackagesTest(TestCase):
         self.be_normal_user()
         response = self.testapp.get('/packages/test-package')
 
+    def test_get_package_caches_page_until_package_changes(self):
+        self.be_admin_user()
+        self.create_package('test-package', '1.0.0')
+        response = self.testapp.get('/packages/test-package')
+        self.assertIn('test-package 1.0.0', response.body)
+
+        # Without invalidating the cache, the cached page is still served.
+        self.set_latest_version('test-package', '1.0.1')
+        response = self.testapp.get('/packages/test-package')
+        self.assertIn('test-package 1.0.0', response.body)
+
+        package = Package.get_by_key_name('test-package')
+        package.invalidate_cache()
+        package.put()
+        response = self.testapp.get('/packages/test-package')
+        self.assertIn('test-package 1.0.1', response.body)
+
+    def test_get_package_page_layout_varies_by_user(self):
+        Package.new(name='test-package', uploaders=[self.admin_user()]).put()
+        self.set_latest_version('test-package', '1.0.0')
+        response = self.testapp.get('/packages/test-package')
+        self.assertIn('class="login"', response.body)
+
+        self.be_normal_user()
+        response = self.testapp.get('/packages/test-package')
+        self.assertIn('class="logout"', response.body)
+
     def test_get_package_json_without_versions(self):
         admin = self.admin_user()
         Package.new(name='test-package', uploaders=[admin]).put()
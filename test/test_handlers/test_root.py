@@ -7,6 +7,8 @@ from testcase import TestCase
 import handlers
 from models.package import Package
 from models.package_version import PackageVersion
+from models import recent_packages
+from models.recent_packages import RecentPackages
 
 class RootTest(TestCase):
     def test_in_production_is_false_in_tests(self):
@@ -32,6 +34,42 @@ class RootTest(TestCase):
         self.assert_list_in_html('/', 'tbody tr th',
             ['bat', 'headcrab', 'gorilla', 'frog', 'elephant'])
 
+    def test_index_lists_uploaded_packages_after_list_is_stored(self):
+        self.be_admin_user()
+        self.create_package('armadillo', '1.0.0')
+        self.create_package('bat', '1.0.0')
+        self.assert_list_in_html('/', 'tbody tr th', ['bat', 'armadillo'])
+
+        self.be_admin_oauth_user()
+        self.post_package_version('1.0.1', name='armadillo')
+        self.post_package_version('1.0.0', name='crocodile')
+        self.run_deferred_tasks()
+
+        self.assert_list_in_html('/', 'tbody tr th',
+            ['crocodile', 'armadillo', 'bat'])
+        self.assertEqual(
+            [package['version'] for package in RecentPackages.get_packages(3)],
+            ['1.0.0', '1.0.1', '1.0.0'])
+
+    def test_index_queries_packages_if_list_is_too_large(self):
+        self.be_admin_user()
+        self.create_package('armadillo', '1.0.0')
+        self.create_package('bat', '1.0.0')
+
+        original = recent_packages._MAX_SIZE
+        recent_packages._MAX_SIZE = 10
+        try:
+            self.assert_list_in_html('/', 'tbody tr th', ['bat', 'armadillo'])
+        finally:
+            recent_packages._MAX_SIZE = original
+        self.assertIsNone(RecentPackages.get_by_key_name('recent').packages)
+
+    def test_warmup_parses_templates(self):
+        self.testapp.get('/_ah/warmup', status=200)
+        self.assertIn('layout', handlers._templates)
+        self.assertIn('pagination', handlers._templates)
+        self.assertIn('packages/versions/index', handlers._templates)
+
     def test_admin_requires_login(self):
         response = self.testapp.get('/admin')
         self.assert_requires_login(response)
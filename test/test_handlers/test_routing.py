@@ -0,0 +1,33 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+import routes
+
+from handlers.routing import PrefixMapper
+from pub_dartlang import Application
+from testcase import TestCase
+
+class RoutingTest(TestCase):
+    def test_prefix_mapper_matches_like_a_plain_mapper(self):
+        mapper = Application().dispatcher.mapper
+        self.assertIsInstance(mapper, PrefixMapper)
+
+        plain = routes.Mapper()
+        plain.matchlist = mapper.matchlist
+        plain.controller_scan = mapper.controller_scan
+        plain.create_regs()
+
+        for url in ['/', '/_ah/warmup', '/feed.atom', '/doc/a/b.html',
+                    '/gs_/packages/foo-1.0.0.tar.gz', '/packages',
+                    '/packages.json', '/packages/foo', '/packages/foo.json',
+                    '/packages/foo/versions/1.0.0.tar.gz',
+                    '/packages/versions/reload.json',
+                    '/packages/versions/new.json', '/api/packages/foo',
+                    '/api/packages/foo/versions/1.0.0',
+                    '/api/packages/versions/abcd/create', '/nonexistent/url']:
+            for method in ['GET', 'POST']:
+                environ = {'REQUEST_METHOD': method}
+                self.assertEqual(mapper.match(url, environ),
+                                 plain.match(url, environ))
+
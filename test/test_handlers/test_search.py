@@ -6,14 +6,15 @@ from google.appengine.api import users
 
 from testcase import TestCase
 
-import handlers.search as search
+from models import search_index
+from models.package import Package
 from models.package_version import PackageVersion
-from models.private_key import PrivateKey
 from models.pubspec import Pubspec
 
 class SearchTest(TestCase):
     def setUp(self):
         super(SearchTest, self).setUp()
+        search_index._terms.clear()
 
         self.be_admin_user()
         packages = [
@@ -29,68 +30,107 @@ class SearchTest(TestCase):
             packageVersion.pubspec.update(
                 description="Description for " + package)
             packageVersion.put()
+            search_index.index_package(package)
 
         self.be_normal_user()
 
     def test_index_show_results(self):
-        self.mock_results(["armadillo", "bandicoot", "cat", "dog", "elephant"])
-
-        self.assert_list_in_html("/search?q=query", "tbody tr", [
-            "armadillo", "bandicoot", "cat", "dog", "elephant"
-        ])
+        self.assert_list_in_html("/search?q=armadillo", "tbody tr",
+                                 ["armadillo"])
 
     def test_index_paginates_results(self):
-        self.mock_results([
-            "armadillo", "bandicoot", "cat", "dog", "elephant",
-            "fox", "gorilla", "hippo", "iguana", "jackal"
-        ], 12)
-
-        self.assert_list_in_html("/search?q=query", "tbody tr", [
+        self.assert_list_in_html("/search?q=description", "tbody tr", [
             "armadillo", "bandicoot", "cat", "dog", "elephant",
             "fox", "gorilla", "hippo", "iguana", "jackal"
         ])
 
-        self.mock_results([
-            "kangaroo", "lemur"
-        ], 12)
-
-        self.assert_list_in_html("/search?q=query&page=2", "tbody tr", [
+        self.assert_list_in_html("/search?q=description&page=2", "tbody tr", [
             "kangaroo", "lemur"
         ])
 
-    def test_index_requires_api_key(self):
-        self.be_admin_oauth_user()
-        PrivateKey.get_by_key_name('api').delete()
+    def test_index_requires_every_term(self):
+        self.assert_list_in_html("/search?q=description+for+cat", "tbody tr",
+                                 ["cat"])
+
+        response = self.testapp.get("/search?q=cat+dog")
+        self.assertIn("did not match any packages", response.body)
+
+    def test_ranks_name_matches_first(self):
+        self.set_description("dog", "A friend for every cat.")
+        self.assert_list_in_html("/search?q=cat", "tbody tr", ["cat", "dog"])
+
+    def test_ranks_names_with_underscores_first(self):
+        self.index_new_package("a_shelf_static")
+        self.index_new_package("shelf_static")
+        self.assert_list_in_html("/search?q=shelf_static", "tbody tr",
+                                 ["shelf_static", "a_shelf_static"])
+
+    def test_matches_names_that_are_stop_words(self):
+        self.index_new_package("lib")
+        self.assert_list_in_html("/search?q=lib", "tbody tr", ["lib"])
 
-        response = self.testapp.get('/search?q=query', status=500)
-        self.assert_error_page(response)
+    def test_reindexing_removes_old_terms(self):
+        self.set_description("dog", "Barks loudly.")
 
-    def test_ignores_results_for_unknown_packages(self):
-        self.mock_results(["armadillo", "mystery_meat", "bandicoot"])
+        response = self.testapp.get("/search?q=description+dog")
+        self.assertIn("did not match any packages", response.body)
+        self.assert_list_in_html("/search?q=barks", "tbody tr", ["dog"])
 
-        self.assert_list_in_html("/search?q=query", "tbody tr", [
-            "armadillo", "bandicoot"
+    def test_ignores_results_for_deleted_packages(self):
+        Package.get_by_key_name("bandicoot").delete()
+
+        self.assert_list_in_html("/search?q=description", "tbody tr", [
+            "armadillo", "cat", "dog", "elephant", "fox",
+            "gorilla", "hippo", "iguana", "jackal"
         ])
 
-    def test_shows_package_metadata(self):
-        self.mock_results(["armadillo"])
+    def test_caches_results_by_normalized_query(self):
+        self.assert_list_in_html("/search?q=armadillo", "tbody tr",
+                                 ["armadillo"])
+
+        for term in search_index.SearchTerm.all(): term.delete()
+        search_index._terms.clear()
+        self.assert_list_in_html("/search?q=ARMADILLO!", "tbody tr",
+                                 ["armadillo"])
 
-        response = self.testapp.get("/search?q=query")
+    def test_ignores_stop_words(self):
+        self.assert_list_in_html("/search?q=the+armadillo", "tbody tr",
+                                 ["armadillo"])
+        self.assertIsNone(search_index.SearchTerm.get_by_key_name("for"))
+
+    def test_reindex_rebuilds_index(self):
+        for term in search_index.SearchTerm.all(): term.delete()
+        for document in search_index.SearchDocument.all(): document.delete()
+        search_index._terms.clear()
+
+        self.be_admin_user()
+        response = self.testapp.post("/search/reindex")
+        self.assertEqual(response.status_int, 302)
+        self.run_deferred_tasks()
+
+        self.assert_list_in_html("/search?q=armadillo", "tbody tr",
+                                 ["armadillo"])
+
+    def test_reindex_requires_dogfooder(self):
+        self.be_normal_user()
+        self.testapp.post("/search/reindex", status=403)
+
+    def test_shows_package_metadata(self):
+        response = self.testapp.get("/search?q=armadillo")
         response_text = self.html(response).get_text()
         self.assertIn("armadillo", response_text)
         self.assertIn("1.0.0", response_text)
         self.assertIn("Description for armadillo", response_text)
         self.assert_link(response, "/packages/armadillo")
 
-    def mock_results(self, packages, total_results=None):
-        if not total_results: total_results = len(packages)
-        """Sets the custom search mock API to return the given packages."""
-        def _make_package_result(package):
-            return {"link": "http://pub.dartlang.org/packages/" + package}
-
-        search.set_mock_resource({
-            "items": [_make_package_result(p) for p in packages],
-            "searchInformation": {
-                "totalResults": len(packages)
-            }
-        })
+    def set_description(self, package, description):
+        """Change the description of a package and re-index it."""
+        version = PackageVersion.get_by_name_and_version(package, "1.0.0")
+        version.pubspec.update(description=description)
+        version.put()
+        search_index.index_package(package)
+
+    def index_new_package(self, package):
+        """Create a package and index it."""
+        self.create_package(package, "1.0.0")
+        search_index.index_package(package)
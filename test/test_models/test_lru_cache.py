@@ -0,0 +1,40 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+import time
+
+from testcase import TestCase
+from models.lru_cache import LRUCache
+
+class LRUCacheTest(TestCase):
+    def test_gets_set_values(self):
+        cache = LRUCache(2)
+        cache.set('foo', 1)
+        self.assertEqual(1, cache.get('foo'))
+        self.assertIsNone(cache.get('bar'))
+        self.assertEqual(2, cache.get('bar', 2))
+
+    def test_discards_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('foo', 1)
+        cache.set('bar', 2)
+        cache.get('foo')
+        cache.set('baz', 3)
+
+        self.assertEqual(1, cache.get('foo'))
+        self.assertIsNone(cache.get('bar'))
+        self.assertEqual(3, cache.get('baz'))
+        self.assertEqual(2, len(cache))
+
+    def test_expires_values(self):
+        cache = LRUCache(2, ttl=0.01)
+        cache.set('foo', 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('foo'))
+
+    def test_deletes_values(self):
+        cache = LRUCache(2)
+        cache.set('foo', 1)
+        cache.delete('foo')
+        self.assertIsNone(cache.get('foo'))
@@ -43,3 +43,22 @@ class PackageTest(TestCase):
 
         set_latest_version('1.2.4', description='some package')
         self.assertEquals('some package', get_description())
+
+    def test_prefetch_latest_versions(self):
+        with_version = Package.new(name='with-version',
+                                   uploaders=[self.admin_user()])
+        with_version.put()
+        version = self.package_version(with_version, '1.2.3')
+        version.put()
+        with_version.latest_version = version
+        with_version.put()
+        Package.new(name='without-version',
+                    uploaders=[self.admin_user()]).put()
+
+        packages = Package.prefetch_latest_versions(
+            Package.all().order('__key__'))
+        self.assertEqual(['with-version', 'without-version'],
+                         [package.name for package in packages])
+        self.assertEqual('1.2.3', str(packages[0].latest_version.version))
+        self.assertIs(packages[0], packages[0].latest_version.package)
+        self.assertIsNone(packages[1].latest_version)
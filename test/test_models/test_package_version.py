@@ -5,6 +5,7 @@
 from cStringIO import StringIO
 
 from testcase import TestCase
+from models.package import Package
 from models.package_version import PackageVersion
 
 class PackageVersionTest(TestCase):
@@ -31,3 +32,41 @@ class PackageVersionTest(TestCase):
         version = PackageVersion.from_archive(StringIO(archive),
                                               uploader=self.admin_user())
         self.assertEqual('This is a README.', version.readme.text)
+
+    def test_imports_from_unseekable_stream(self):
+        pubspec = {'name': 'test-package', 'version': '1.0.0'}
+        archive = self.tar_package(pubspec, {
+            'README.md': 'This is a README.',
+            'CHANGELOG.md': 'This is a CHANGELOG.',
+            'lib/foo.dart': '',
+        })
+        version = PackageVersion.from_archive(
+            _UnseekableFile(archive), uploaderEmail=self.admin_user().email())
+        self.assertEqual('This is a README.', version.readme.text)
+        self.assertEqual('This is a CHANGELOG.', version.changelog.text)
+        self.assertEqual(['foo.dart'], version.libraries)
+
+    def test_pubspec_survives_save_without_being_read(self):
+        package = Package.new(name='test-package',
+                              uploaderEmails=[self.admin_user().email()])
+        package.put()
+        self.package_version(package, '1.0.0', description='A package.').put()
+
+        version = PackageVersion.get_by_name_and_version('test-package',
+                                                         '1.0.0')
+        version.downloads = 10
+        version.put()
+
+        version = PackageVersion.get_by_name_and_version('test-package',
+                                                         '1.0.0')
+        self.assertEqual(version.pubspec['description'], 'A package.')
+        self.assertEqual(version.pubspec.required('version'), '1.0.0')
+
+class _UnseekableFile(object):
+    """A file-like object that can only be read from front to back."""
+
+    def __init__(self, contents):
+        self._io = StringIO(contents)
+
+    def read(self, size=-1):
+        return self._io.read(size)
@@ -0,0 +1,31 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+from google.appengine.ext import db
+
+from testcase import TestCase
+from models.private_key import PrivateKey
+
+class PrivateKeyTest(TestCase):
+    def test_caches_keys_on_instance(self):
+        PrivateKey.set_api('first')
+        self.assertEqual('first', PrivateKey.get_api())
+
+        # Writing the entity directly doesn't clear the cache.
+        db.put([PrivateKey(key_name='api', value='second')])
+        self.assertEqual('first', PrivateKey.get_api())
+
+    def test_setting_key_clears_cache(self):
+        PrivateKey.set_api('first')
+        self.assertEqual('first', PrivateKey.get_api())
+
+        PrivateKey.set_api('second')
+        self.assertEqual('second', PrivateKey.get_api())
+
+    def test_deleting_key_clears_cache(self):
+        PrivateKey.set_api('first')
+        self.assertEqual('first', PrivateKey.get_api())
+
+        PrivateKey.get_by_key_name('api').delete()
+        self.assertIsNone(PrivateKey.get_api())
@@ -75,5 +75,16 @@ class PubspecTest(TestCase):
             documentation="data:image/png;base64,somedata")
         self.assert_invalid_pubspec(documentation="no-scheme.com")
 
+    def test_parse(self):
+        self.assertEqual(
+            Pubspec.parse("name: foo\nversion: 1.0.0\n"
+                          "dependencies:\n  bar: '>=1.0.0'\n"),
+            {'name': 'foo', 'version': '1.0.0',
+             'dependencies': {'bar': '>=1.0.0'}})
+
+    def test_parse_refuses_python_objects(self):
+        self.assertRaises(db.BadValueError, lambda: Pubspec.parse(
+            "name: !!python/object/apply:os.system ['true']"))
+
     def assert_invalid_pubspec(self, **kwargs):
         self.assertRaises(db.BadValueError, lambda: Pubspec(**kwargs))
@@ -8,6 +8,8 @@ import tarfile
 
 from testcase import TestCase
 from models.readme import Readme
+from models.rendered_readme import RenderedReadme
+import models.readme
 
 class ReadmeTest(TestCase):
     def test_extracts_readme_from_archive(self):
@@ -54,6 +56,15 @@ class ReadmeTest(TestCase):
             "CHANGELOG.md", ["CHANGELOG.md", "changelog.a"],
             pattern="CHANGELOG")
 
+    def test_extracts_readme_from_files(self):
+        readme = Readme.from_files({
+            'README.md': 'This is a README.',
+            'doc/README': 'This is a nested README.',
+            'pubspec.yaml': '',
+        })
+        self.assertEqual('README.md', readme.filename)
+        self.assertIsNone(Readme.from_files({'NOT_README': ''}))
+
     def test_decodes_valid_utf_8(self):
         archive = self.archive({'README': 'This is a R\303\213ADM\303\213.'})
         readme = Readme.from_archive(archive)
@@ -103,6 +114,22 @@ class ReadmeTest(TestCase):
         self.assertEqual("<p>This is a <em>&lt;README&gt;</em>.</p>",
                          readme.render())
 
+    def test_stores_rendered_readme(self):
+        readme = Readme("This is a *stored README*.", "README.md")
+        html = readme.render()
+        self.assertEqual(html, RenderedReadme.get_html(readme.content_hash))
+
+    def test_serves_stored_readme(self):
+        readme = Readme("This is a *stored README*.", "README.md")
+        RenderedReadme.store(readme.content_hash, u"<p>Stored.</p>")
+        models.readme._rendered.clear()
+        self.assertEqual(u"<p>Stored.</p>", readme.render())
+
+    def test_content_hash_depends_on_format(self):
+        self.assertNotEqual(
+            Readme("This is a README.", "README").content_hash,
+            Readme("This is a README.", "README.md").content_hash)
+
     def assert_extracts_readme(self, chosen, names=None, pattern=None):
         """Assert that the given README is extracted from an archive.
 
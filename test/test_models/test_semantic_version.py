@@ -3,6 +3,7 @@
 # BSD-style license that can be found in the LICENSE file.
 
 import itertools
+import pickle
 from google.appengine.ext import db
 
 from testcase import TestCase
@@ -64,6 +65,33 @@ class SemanticVersionTest(TestCase):
         self.assertEqual(str(SemanticVersion("1.2.3-01").canonical), "1.2.3-1")
         self.assertEqual(str(SemanticVersion("1.2.3+01").canonical), "1.2.3+1")
 
+    def test_sort_key_ordering(self):
+        versions = ["0.9.10", "0.10.0", "1.0.0-1", "1.0.0-alpha",
+                    "1.0.0-alpha.1", "1.0.0-alpha.beta", "1.0.0-beta.2",
+                    "1.0.0-beta.11", "1.0.0-rc.1", "1.0.0-rc.1+build.1",
+                    "1.0.0", "1.0.0+0.3.7", "1.3.7+build",
+                    "1.3.7+build.2.b8f12d7", "1.3.7+build.11.e0f985a",
+                    "10.0.0"]
+
+        for version1, version2 in _pairs(versions):
+            self.assertTrue(
+                SemanticVersion(version1).sort_key <
+                    SemanticVersion(version2).sort_key,
+                "Expected sort key of %s < %s" % (version1, version2))
+
+    def test_sort_key_equality(self):
+        self.assertEqual(SemanticVersion("01.2.3-01").sort_key,
+                         SemanticVersion("1.2.3-1").sort_key)
+
+    def test_interns_versions(self):
+        self.assertIs(SemanticVersion("1.2.3"), SemanticVersion("1.2.3"))
+
+    def test_pickles(self):
+        version = SemanticVersion("1.2.3-beta+build")
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEqual(
+                pickle.loads(pickle.dumps(version, protocol)), version)
+
 def _pairs(iterable):
     a, b = itertools.tee(iterable)
     next(b, None)
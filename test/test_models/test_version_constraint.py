@@ -0,0 +1,49 @@
+# Copyright (c) 2016, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+from testcase import TestCase
+from models.semantic_version import SemanticVersion
+from models.version_constraint import VersionConstraint, version_index
+
+class VersionConstraintTest(TestCase):
+    def setUp(self):
+        super(VersionConstraintTest, self).setUp()
+        self.index = version_index(SemanticVersion(version) for version in [
+            '0.9.0', '1.0.0', '1.2.0', '1.2.5', '1.3.0-dev', '1.9.9',
+            '2.0.0-dev.1', '2.0.0', '2.1.0-beta'
+        ])
+
+    def test_any(self):
+        self.assert_best_match('any', '2.0.0')
+
+    def test_exact(self):
+        self.assert_best_match('1.2.0', '1.2.0')
+        self.assert_best_match('1.2.1', None)
+
+    def test_caret(self):
+        self.assert_best_match('^1.2.0', '1.9.9')
+        self.assert_best_match('^0.9.0', '0.9.0')
+        self.assert_best_match('^3.0.0', None)
+
+    def test_range(self):
+        self.assert_best_match('>=1.0.0 <1.2.5', '1.2.0')
+        self.assert_best_match('>1.0.0 <=1.2.5', '1.2.5')
+        self.assert_best_match('>=1.3.0 <1.9.9', None)
+
+    def test_max_excludes_its_prereleases(self):
+        self.assert_best_match('<2.0.0', '1.9.9')
+        self.assert_best_match('>=2.0.0-dev <2.0.0', '2.0.0-dev.1')
+
+    def test_prefers_releases_to_prereleases(self):
+        self.assert_best_match('>=1.2.5 <1.9.9', '1.2.5')
+        self.assert_best_match('>2.0.0', '2.1.0-beta')
+
+    def test_invalid(self):
+        for constraint in ['foo', '>=', '^x', '1.2.3 <']:
+            self.assertRaises(ValueError,
+                              lambda: VersionConstraint.parse(constraint))
+
+    def assert_best_match(self, constraint, expected):
+        version = VersionConstraint.parse(constraint).best_match(self.index)
+        self.assertEqual(None if version is None else str(version), expected)